@@ -6,40 +6,50 @@ from flask_jwt_extended import JWTManager
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_caching import Cache
+from app.database import RoutingSession, init_engines
+from app.group_commit import group_committer
+from app.hashing import PasswordHasher
+from app.json_provider import JSONProvider
+from app.log import request_logging
+from app.metrics import metrics
+from app.profiling import profiler
+from app import limiter_storage  # Registers the sqlite:// rate limit storage scheme
 from config import Config
-import logging
-from logging.handlers import RotatingFileHandler
 
-db = SQLAlchemy()
+# Reads of read-only views can be routed to replicas (see app/database.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 jwt = JWTManager()
 limiter = Limiter(key_func=get_remote_address)
 cache = Cache()
+hasher = PasswordHasher()
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    app.json = JSONProvider(app)
+    # Rate limit counters default to a private file in the instance folder, like the cache
+    if not app.config.get('RATELIMIT_STORAGE_URI'):
+        app.config['RATELIMIT_STORAGE_URI'] = 'sqlite:///' + os.path.join(app.instance_path, 'ratelimit.db')
 
     db.init_app(app)
+    init_engines(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
     limiter.init_app(app)
     cache.init_app(app)
+    hasher.init_app(app)
+    group_committer.init_app(app)
+    # Registered before the other request hooks so they wrap the whole request and see the final response
+    profiler.init_app(app)
+    metrics.init_app(app)
+    request_logging.init_app(app)
 
     from app import routes
     app.register_blueprint(routes.bp)
 
-    if not app.debug and not app.testing:
-        if not os.path.exists('logs'):
-            os.mkdir('logs')
-        file_handler = RotatingFileHandler('logs/blog_api.log', maxBytes=10240, backupCount=10)
-        file_handler.setFormatter(logging.Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
-        file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
-
-        app.logger.setLevel(logging.INFO)
-        app.logger.info('Blog API startup')
+    from app.compression import compress
+    compress.init_app(app)
 
     return app
 
@@ -0,0 +1,175 @@
+import os
+import pickle
+import sqlite3
+import time
+from flask_caching.backends.base import BaseCache
+from app.sqlite_local import LocalConnection, check_private
+
+# Cache backend shared by every worker process on a host, usable as
+# CACHE_TYPE = 'app.cache_backends.SQLiteCache'. Entries live in a SQLite file
+# (CACHE_SQLITE_PATH) and the total size of stored values is capped at
+# CACHE_MAX_BYTES by evicting expired entries first, then least recently used ones.
+# Every operation is a single statement or an IMMEDIATE transaction, so get/set/add/inc
+# are atomic across processes. The running total is kept by triggers.
+class SQLiteCache(BaseCache):
+    # Access times are only refreshed when older than this many seconds, so most
+    # reads do not have to take the write lock
+    ACCESS_RESOLUTION = 1.0
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, default_timeout=300, key_prefix='', timeout=5.0):
+        super().__init__(default_timeout=default_timeout)
+        # Values are unpickled, so whoever can write the database can run code in every worker
+        check_private(path)
+        self.max_bytes = max_bytes
+        self.key_prefix = key_prefix
+        self._connection = LocalConnection(path, timeout).get
+        self._connection().executescript('''
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL,
+                size INTEGER NOT NULL, accessed REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS ix_cache_accessed ON cache (accessed);
+            CREATE TABLE IF NOT EXISTS cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL);
+            INSERT OR IGNORE INTO cache_size (id, total) VALUES (0, 0);
+            CREATE TRIGGER IF NOT EXISTS cache_size_insert AFTER INSERT ON cache
+                BEGIN UPDATE cache_size SET total = total + NEW.size; END;
+            CREATE TRIGGER IF NOT EXISTS cache_size_update AFTER UPDATE OF size ON cache
+                BEGIN UPDATE cache_size SET total = total + NEW.size - OLD.size; END;
+            CREATE TRIGGER IF NOT EXISTS cache_size_delete AFTER DELETE ON cache
+                BEGIN UPDATE cache_size SET total = total - OLD.size; END;
+        ''')
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(
+            path=config.get('CACHE_SQLITE_PATH') or os.path.join(app.instance_path, 'cache.db'),
+            max_bytes=config.get('CACHE_MAX_BYTES', 64 * 1024 * 1024),
+            key_prefix=config.get('CACHE_KEY_PREFIX') or '',
+        )
+        return cls(*args, **kwargs)
+
+    # Absolute expiry time for a timeout; None means the entry never expires
+    def _expires(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return None if timeout == 0 else time.time() + timeout
+
+    # Run fn(connection) inside an IMMEDIATE transaction, taking the write lock up front
+    def _transaction(self, fn):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            result = fn(connection)
+            connection.execute('COMMIT')
+            return result
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    # Bring the total size back under the cap: expired entries first, then least recently used
+    def _evict(self, connection, keep):
+        total = connection.execute('SELECT total FROM cache_size').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        connection.execute('DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?', (time.time(),))
+        while connection.execute('SELECT total FROM cache_size').fetchone()[0] > self.max_bytes:
+            deleted = connection.execute('''
+                DELETE FROM cache WHERE key = (
+                    SELECT key FROM cache WHERE key != ? ORDER BY accessed LIMIT 1)
+            ''', (keep,)).rowcount
+            if not deleted:
+                break
+
+    def _read(self, connection, key, now):
+        row = connection.execute(
+            'SELECT value, expires, accessed FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            return None
+        return row
+
+    def _write(self, connection, key, value, expires):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return False
+        connection.execute('''
+            INSERT INTO cache (key, value, expires, size, accessed) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                value = excluded.value, expires = excluded.expires,
+                size = excluded.size, accessed = excluded.accessed
+        ''', (key, data, expires, len(data), time.time()))
+        self._evict(connection, key)
+        return True
+
+    def get(self, key):
+        key = self.key_prefix + key
+        now = time.time()
+        try:
+            row = self._read(self._connection(), key, now)
+            if row is None:
+                return None
+            if now - row[2] > self.ACCESS_RESOLUTION:
+                self._connection().execute('UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+            return pickle.loads(row[0])
+        except (sqlite3.Error, pickle.PickleError):
+            return None
+
+    def set(self, key, value, timeout=None):
+        key = self.key_prefix + key
+        expires = self._expires(timeout)
+        try:
+            return self._transaction(lambda connection: self._write(connection, key, value, expires))
+        except sqlite3.Error:
+            return False
+
+    # Store the value only if the key is missing or expired, atomically across processes
+    def add(self, key, value, timeout=None):
+        key = self.key_prefix + key
+        expires = self._expires(timeout)
+
+        def add_missing(connection):
+            if self._read(connection, key, time.time()) is not None:
+                return False
+            return self._write(connection, key, value, expires)
+        try:
+            return self._transaction(add_missing)
+        except sqlite3.Error:
+            return False
+
+    def delete(self, key):
+        try:
+            return self._connection().execute(
+                'DELETE FROM cache WHERE key = ?', (self.key_prefix + key,)).rowcount > 0
+        except sqlite3.Error:
+            return False
+
+    def has(self, key):
+        try:
+            return self._connection().execute(
+                'SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (self.key_prefix + key, time.time())).fetchone() is not None
+        except sqlite3.Error:
+            return False
+
+    def clear(self):
+        try:
+            self._connection().execute('DELETE FROM cache')
+            return True
+        except sqlite3.Error:
+            return False
+
+    # Atomically add delta to a stored integer (0 if missing), keeping its expiry
+    def inc(self, key, delta=1):
+        key = self.key_prefix + key
+
+        def increment(connection):
+            now = time.time()
+            row = self._read(connection, key, now)
+            value = (pickle.loads(row[0]) if row else 0) + delta
+            expires = row[1] if row else self._expires(None)
+            self._write(connection, key, value, expires)
+            return value
+        try:
+            return self._transaction(increment)
+        except sqlite3.Error:
+            return None
+
+    def dec(self, key, delta=1):
+        return self.inc(key, delta=-delta)
@@ -0,0 +1,201 @@
+import hashlib
+import math
+import random
+import threading
+import time
+import uuid
+from functools import wraps
+from flask import request, make_response, current_app as app
+from flask_jwt_extended import get_jwt_identity
+from app import cache
+from app.metrics import metrics
+
+# Response headers that are stored alongside a cached body and replayed on a hit
+CACHED_HEADERS = ('Content-Type', 'ETag')
+
+# Hit/miss counters for the per-user response cache (kept per process)
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0
+        }
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+stats = CacheStats()
+
+# Key holding the current version stamp of a user's namespace
+def _version_key(namespace, user_id):
+    return f'{namespace}:ver:{user_id}'
+
+# Return the current version stamp of a user's namespace, creating one if missing.
+# A missing stamp (first use or eviction) gets a fresh random value, so entries
+# written under an older stamp can never be served again.
+def get_user_version(namespace, user_id):
+    key = _version_key(namespace, user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=0)
+        version = cache.get(key)
+    return version
+
+# Move a user's namespace to a new version, orphaning every entry cached under the old one
+def bump_user_version(namespace, user_id):
+    cache.set(_version_key(namespace, user_id), uuid.uuid4().hex, timeout=0)
+
+# Take the recomputation lock of a key; only one caller across all workers gets it
+def _acquire(key, timeout):
+    return cache.add(f'{key}:lock', True, timeout=timeout)
+
+def _release(key):
+    cache.delete(f'{key}:lock')
+
+# Probabilistic early expiration ("XFetch"): the closer an entry is to expiring and the
+# longer it took to compute, the likelier a caller refreshes it before it expires, so
+# refreshes of a hot key are spread out instead of all landing on the expiry instant
+def _expires_early(envelope, now, beta):
+    return now - envelope['delta'] * beta * math.log(1.0 - random.random()) >= envelope['expires']
+
+def _store(key, compute, timeout, stale_ttl):
+    start = time.time()
+    value = compute()
+    if value is not None:
+        now = time.time()
+        cache.set(key, {'value': value, 'expires': now + timeout, 'delta': now - start}, timeout=timeout + stale_ttl)
+    return value
+
+# Return (value, state) for key, computing it with compute() when needed. State is 'hit',
+# 'stale' (served past its timeout while another caller recomputes) or 'miss'. compute may
+# return None to skip caching its result.
+#
+# - Single flight: only the caller holding the key's lock recomputes. Without any cached
+#   value the others poll for up to lock_wait seconds, or until the lock is released
+#   without a cached result, before computing it themselves.
+# - Stale-while-revalidate: entries are kept stale_ttl seconds past their timeout and
+#   served as is while the lock holder recomputes them.
+# - Early expiration: see _expires_early; beta > 1 refreshes earlier, 0 disables it.
+def fetch(key, compute, timeout, stale_ttl=0, beta=1.0, lock_timeout=10, lock_wait=5, poll_interval=0.05):
+    now = time.time()
+    envelope = cache.get(key)
+    if envelope is not None:
+        if now < envelope['expires'] and not _expires_early(envelope, now, beta):
+            return envelope['value'], 'hit'
+        if _acquire(key, lock_timeout):
+            try:
+                return _store(key, compute, timeout, stale_ttl), 'miss'
+            finally:
+                _release(key)
+        return envelope['value'], 'hit' if now < envelope['expires'] else 'stale'
+
+    if _acquire(key, lock_timeout):
+        try:
+            return _store(key, compute, timeout, stale_ttl), 'miss'
+        finally:
+            _release(key)
+    deadline = now + lock_wait
+    while time.time() < deadline:
+        time.sleep(poll_interval)
+        envelope = cache.get(key)
+        if envelope is not None:
+            return envelope['value'], 'hit'
+        # Released without caching anything (an uncacheable result or an error):
+        # nothing will show up, so compute now rather than waiting out lock_wait
+        if not cache.has(f'{key}:lock'):
+            # Unless the result was cached just before the lock was released
+            envelope = cache.get(key)
+            if envelope is not None:
+                return envelope['value'], 'hit'
+            break
+    # The lock holder is done without a cached result, or is too slow
+    return _store(key, compute, timeout, stale_ttl), 'miss'
+
+# Keyword arguments of fetch() from the application config
+def _fetch_options(timeout):
+    return {
+        'timeout': timeout,
+        'stale_ttl': app.config['CACHE_STALE_TTL'],
+        'beta': app.config['CACHE_EARLY_EXPIRATION_BETA'],
+        'lock_timeout': app.config['CACHE_LOCK_TIMEOUT'],
+        'lock_wait': app.config['CACHE_LOCK_WAIT'],
+    }
+
+# Cache the return value of a function with fetch(): single-flight recomputation,
+# stale-while-revalidate and early expiration. The key is built from the function name
+# and its arguments unless key_func(*args, **kwargs) is given; None results are not cached.
+def memoize(timeout=60, key_func=None):
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if key_func is not None:
+                key = key_func(*args, **kwargs)
+            else:
+                digest = hashlib.md5(repr((args, sorted(kwargs.items()))).encode('utf-8')).hexdigest()
+                key = f'memoize:{f.__module__}.{f.__qualname__}:{digest}'
+            return fetch(key, lambda: f(*args, **kwargs), **_fetch_options(timeout))[0]
+        return decorated
+    return decorator
+
+# Build the cache key for the current request from user, namespace version and query args
+def _make_key(namespace, user_id):
+    args = sorted(request.args.items(multi=True))
+    digest = hashlib.md5(repr(args).encode('utf-8')).hexdigest()
+    version = get_user_version(namespace, user_id)
+    return f'{namespace}:{user_id}:{version}:{request.path}:{digest}'
+
+# Cache successful responses of a JWT-protected view per user. Entries are
+# invalidated by bump_user_version() rather than by waiting for the timeout, and are
+# refreshed through fetch(), so an expiring popular entry is recomputed by one request
+# while concurrent ones get the stale copy. Conditional requests are answered from the
+# cached ETag on a hit.
+def cached_per_user(timeout=60, namespace='posts'):
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            user_id = get_jwt_identity()
+            key = _make_key(namespace, user_id)
+            computed = {}
+
+            def compute():
+                response = computed['response'] = make_response(f(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return None
+                return {
+                    'body': response.get_data(),
+                    'status': response.status_code,
+                    'headers': [(name, response.headers[name]) for name in CACHED_HEADERS if name in response.headers]
+                }
+
+            entry, state = fetch(key, compute, **_fetch_options(timeout))
+            stats.record(hit=state != 'miss')
+            metrics.record_cache(namespace, state)
+            if 'response' in computed:
+                response = computed['response']
+                response.headers['X-Cache'] = 'MISS'
+                return response
+
+            response = app.response_class(entry['body'], status=entry['status'], headers=entry['headers'])
+            response.headers['X-Cache'] = state.upper()
+            # Answer If-None-Match from the cached ETag without touching the database
+            return response.make_conditional(request)
+        return decorated
+    return decorator
@@ -0,0 +1,91 @@
+import zlib
+from flask import request, current_app as app
+from app import cache
+
+# zstd is optional; gzip is always available through zlib
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Response compression negotiated through Accept-Encoding, registered as an after_request hook
+class Compress:
+    def init_app(self, app):
+        app.after_request(self.after_request)
+
+    # Encodings this process can produce, in server preference order
+    def available_encodings(self):
+        return [name for name in app.config['COMPRESS_ALGORITHMS'] if name == 'gzip' or (name == 'zstd' and zstandard)]
+
+    def after_request(self, response):
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or response.mimetype not in app.config['COMPRESS_MIMETYPES']
+                or 'Content-Encoding' in response.headers
+                or response.direct_passthrough):
+            return response
+
+        # The representation depends on Accept-Encoding from here on, whatever this client sent
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(self.available_encodings())
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            # Chunked responses (e.g. exports) are compressed chunk by chunk and flushed
+            # after each one so the client keeps receiving data as it is produced
+            original = response.response
+            response.response = self._compress_stream(original, response.iter_encoded(), encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < app.config['COMPRESS_MIN_SIZE']:
+                return response
+            etag, weak = response.get_etag()
+            response.set_data(self._compress_cached(data, encoding, None if weak else etag))
+
+        response.headers['Content-Encoding'] = encoding
+        # A strong ETag must not be shared between encodings; weaken it like other
+        # servers do, which still matches If-None-Match under weak comparison
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    # Compress a whole body, reusing the stored result when the body is identified by a strong ETag
+    def _compress_cached(self, data, encoding, etag):
+        if not etag:
+            return self._compress(data, encoding)
+        key = f'compress:{encoding}:{self._level(encoding)}:{request.path}:{etag}'
+        compressed = cache.get(key)
+        if compressed is None:
+            compressed = self._compress(data, encoding)
+            cache.set(key, compressed, timeout=app.config['COMPRESS_CACHE_TIMEOUT'])
+        return compressed
+
+    def _level(self, encoding):
+        return app.config['COMPRESS_ZSTD_LEVEL'] if encoding == 'zstd' else app.config['COMPRESS_LEVEL']
+
+    def _compress(self, data, encoding):
+        compressor = self._compressor(encoding)
+        return compressor.compress(data) + compressor.flush()
+
+    # Return a compressobj-style object for the encoding; zlib wbits=31 writes a gzip container
+    def _compressor(self, encoding):
+        if encoding == 'zstd':
+            return zstandard.ZstdCompressor(level=self._level(encoding)).compressobj()
+        return zlib.compressobj(self._level(encoding), zlib.DEFLATED, 31)
+
+    def _compress_stream(self, original, chunks, encoding):
+        compressor = self._compressor(encoding)
+        sync_flush = zstandard.COMPRESSOBJ_FLUSH_BLOCK if encoding == 'zstd' else zlib.Z_SYNC_FLUSH
+        try:
+            for chunk in chunks:
+                data = compressor.compress(chunk) + compressor.flush(sync_flush)
+                if data:
+                    yield data
+            yield compressor.flush()
+        finally:
+            if hasattr(original, 'close'):
+                original.close()
+
+compress = Compress()
@@ -0,0 +1,121 @@
+import random
+import time
+from functools import wraps
+from flask import g, has_app_context, has_request_context, current_app as app
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+# Session that sends the reads of read-only views (see read_replica) to a replica bind
+# and everything else to the primary. Writes, flushes and DML statements always go to
+# the primary, even inside a read-only view.
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context() and g.get('db_replica') and not self._flushing \
+                and not getattr(clause, 'is_dml', False):
+            return self._db.engines[g.db_replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+# Cache key marking a user whose recent writes may not have reached the replicas yet
+def _sticky_key(user_id):
+    return f'db:sticky:{user_id}'
+
+# Keep a user's reads on the primary for DATABASE_STICKY_SECONDS after a write
+def stick_to_primary(user_id):
+    if app.config['DATABASE_REPLICAS']:
+        from app import cache
+        cache.set(_sticky_key(user_id), True, timeout=app.config['DATABASE_STICKY_SECONDS'])
+
+def _current_user():
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+# Serve the reads of a view from a randomly chosen replica in DATABASE_REPLICAS, unless
+# the current user wrote something in the last DATABASE_STICKY_SECONDS: then the primary
+# answers, so users always read their own writes. Stickiness is kept in the shared cache,
+# so it holds whichever worker process serves the next request.
+def read_replica(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        from app import cache
+        replicas = app.config['DATABASE_REPLICAS']
+        user_id = _current_user()
+        if not replicas or (user_id is not None and cache.get(_sticky_key(user_id))):
+            return f(*args, **kwargs)
+        g.db_replica = random.choice(replicas)
+        try:
+            return f(*args, **kwargs)
+        finally:
+            g.pop('db_replica', None)
+    return decorated
+
+# Remember that the session wrote something, for the stickiness check after commit
+@event.listens_for(RoutingSession, 'after_flush')
+def _flushed(session, flush_context):
+    session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _executed(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _committed(session):
+    if session.info.pop('wrote', False) and has_app_context():
+        user_id = _current_user()
+        if user_id is not None:
+            stick_to_primary(user_id)
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _rolled_back(session):
+    session.info.pop('wrote', None)
+
+# Abort statements of a request running longer than DATABASE_STATEMENT_TIMEOUT milliseconds.
+# Only requests are limited: CLI commands, migrations and background work may run long
+# statements (backfills, index builds) on purpose. PostgreSQL gets SET LOCAL
+# statement_timeout at the start of each request transaction; SQLite gets a progress
+# handler checking a per-statement deadline, armed only inside a request.
+@event.listens_for(RoutingSession, 'after_begin')
+def _limit_request_transaction(session, transaction, connection):
+    if has_request_context() and connection.dialect.name == 'postgresql':
+        timeout = app.config['DATABASE_STATEMENT_TIMEOUT']
+        if timeout:
+            connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout)}')
+
+def _apply_statement_timeout(engine, timeout):
+    if engine.dialect.name == 'sqlite':
+        @event.listens_for(engine, 'connect')
+        def install_handler(dbapi_connection, connection_record):
+            deadline = connection_record.info['statement_deadline'] = [None]
+            dbapi_connection.set_progress_handler(
+                lambda: 1 if deadline[0] is not None and time.monotonic() > deadline[0] else 0, 1000)
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def start_deadline(conn, cursor, statement, parameters, context, executemany):
+            deadline = conn.connection.info.get('statement_deadline')
+            if deadline is not None:
+                deadline[0] = time.monotonic() + timeout / 1000 if has_request_context() else None
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def clear_deadline(conn, cursor, statement, parameters, context, executemany):
+            deadline = conn.connection.info.get('statement_deadline')
+            if deadline is not None:
+                deadline[0] = None
+
+        # after_cursor_execute does not run for failed statements
+        @event.listens_for(engine, 'handle_error')
+        def clear_deadline_on_error(exception_context):
+            if exception_context.connection is not None:
+                clear_deadline(exception_context.connection, None, None, None, None, None)
+
+# Install per-engine settings on the primary and every replica bind
+def init_engines(app):
+    timeout = app.config['DATABASE_STATEMENT_TIMEOUT']
+    if not timeout:
+        return
+    from app import db
+    with app.app_context():
+        for engine in db.engines.values():
+            _apply_statement_timeout(engine, timeout)
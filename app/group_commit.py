@@ -0,0 +1,111 @@
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, TimeoutError
+from flask import current_app as app
+from sqlalchemy import insert
+from app.metrics import metrics
+
+# Raised when a queued post was not committed within GROUP_COMMIT_TIMEOUT seconds; the
+# committer may still commit it afterwards
+class GroupCommitTimeout(Exception):
+    pass
+
+# Group commit of new posts (GROUP_COMMIT_ENABLED). Instead of one transaction, and
+# one fsync, per POST /posts, requests hand their post to a background thread that
+# collects whatever arrives within GROUP_COMMIT_MAX_WAIT seconds (up to
+# GROUP_COMMIT_MAX_BATCH posts) and inserts it with a single INSERT ... RETURNING in
+# one transaction. Each request then gets its own id back. If the batch fails, its
+# posts are retried one per transaction so each request gets its own error.
+#
+# The thread is started on first use in each process (and again after a fork). A
+# request gives up after GROUP_COMMIT_TIMEOUT seconds; its post may still be committed.
+class GroupCommitter:
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.extensions['group_commit'] = {'queue': None, 'thread': None, 'pid': None}
+
+    # Return the queue of this app's committer thread, starting the thread if needed
+    def _queue(self):
+        state = app.extensions['group_commit']
+        with self._lock:
+            if state['thread'] is None or state['pid'] != os.getpid() or not state['thread'].is_alive():
+                state['queue'] = queue.SimpleQueue()
+                state['thread'] = threading.Thread(target=self._run, args=(app._get_current_object(), state['queue']),
+                                                   name='group-commit', daemon=True)
+                state['pid'] = os.getpid()
+                state['thread'].start()
+            return state['queue']
+
+    # Queue a new post and wait for the transaction committing it; returns the post id
+    # or raises the error its insert hit, or GroupCommitTimeout
+    def create_post(self, title, body, user_id):
+        future = Future()
+        self._queue().put(({'title': title, 'body': body, 'user_id': user_id}, future))
+        try:
+            return future.result(timeout=app.config['GROUP_COMMIT_TIMEOUT'])
+        except TimeoutError:
+            raise GroupCommitTimeout('Post was not committed in time')
+
+    def _run(self, app, pending):
+        max_batch = app.config['GROUP_COMMIT_MAX_BATCH']
+        max_wait = app.config['GROUP_COMMIT_MAX_WAIT']
+        while True:
+            batch = [pending.get()]
+            deadline = time.monotonic() + max_wait
+            while len(batch) < max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            with app.app_context():
+                self._commit(batch)
+
+    def _commit(self, batch):
+        from app import db
+        batch = [(row, future) for row, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            ids = self._insert([row for row, _ in batch])
+        except Exception as e:
+            db.session.rollback()
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            app.logger.warning('Group commit of %s posts failed, retrying them one by one: %s', len(batch), e)
+            metrics.inc('group_commit_batches_total', (('result', 'retried'),))
+            for row, future in batch:
+                try:
+                    future.set_result(self._insert([row])[0])
+                except Exception as e:
+                    db.session.rollback()
+                    future.set_exception(e)
+        else:
+            for (row, future), post_id in zip(batch, ids):
+                future.set_result(post_id)
+        finally:
+            db.session.remove()
+
+    # Insert rows and update the owners' post counters in one transaction; returns the ids in row order
+    @staticmethod
+    def _insert(rows):
+        from app import db
+        from app.models import User, BlogPost
+        result = db.session.execute(insert(BlogPost).returning(BlogPost.id, sort_by_parameter_order=True), rows)
+        ids = result.scalars().all()
+        for user_id, count in Counter(row['user_id'] for row in rows).items():
+            User.adjust_post_count(user_id, count)
+        db.session.commit()
+        metrics.observe('group_commit_batch_size', (), len(rows))
+        metrics.inc('group_commit_batches_total', (('result', 'committed'),))
+        return ids
+
+group_committer = GroupCommitter()
@@ -0,0 +1,90 @@
+import atexit
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from flask import current_app as app
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+# Raised when the hashing pool is saturated or a job does not finish in time
+class HasherBusy(Exception):
+    pass
+
+# Function to expand a werkzeug hash method to the full form stored in hashes,
+# e.g. 'scrypt' -> 'scrypt:32768:8:1', so configured and stored methods compare equal
+def normalize_method(method):
+    name, *params = method.split(':')
+    if name == 'scrypt':
+        defaults = ['32768', '8', '1']
+    elif name == 'pbkdf2':
+        defaults = ['sha256', str(DEFAULT_PBKDF2_ITERATIONS)]
+    else:
+        return method
+    return ':'.join([name] + params + defaults[len(params):])
+
+# Runs werkzeug's deliberately expensive password hashing in a process pool so it
+# does not hold the request thread (and the GIL). The pool accepts at most
+# PASSWORD_HASH_WORKERS running plus PASSWORD_HASH_QUEUE_SIZE waiting jobs per
+# process; beyond that HasherBusy is raised and the caller answers 503.
+# With PASSWORD_HASH_WORKERS = 0 hashing runs inline.
+class PasswordHasher:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self._pid = None
+
+    def init_app(self, app):
+        app.extensions['password_hasher'] = self
+
+    # Return this process's pool, creating it on first use; pools do not survive a fork
+    def _pool(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                workers = app.config['PASSWORD_HASH_WORKERS']
+                self._executor = ProcessPoolExecutor(max_workers=workers)
+                self._slots = threading.BoundedSemaphore(workers + app.config['PASSWORD_HASH_QUEUE_SIZE'])
+                self._pid = os.getpid()
+                atexit.register(self._executor.shutdown, wait=False, cancel_futures=True)
+            return self._executor, self._slots
+
+    # Start this process's pool ahead of the first login (no-op when hashing runs inline)
+    def start(self):
+        if app.config['PASSWORD_HASH_WORKERS']:
+            executor, _ = self._pool()
+            executor.submit(normalize_method, app.config['PASSWORD_HASH_METHOD']).result(timeout=app.config['PASSWORD_HASH_TIMEOUT'])
+
+    def _run(self, fn, *args):
+        if not app.config['PASSWORD_HASH_WORKERS']:
+            return fn(*args)
+        executor, slots = self._pool()
+        if not slots.acquire(blocking=False):
+            raise HasherBusy('Password hashing queue is full')
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException:
+            slots.release()
+            raise
+        # The slot is held until the job is done, not just until this request stops
+        # waiting, so jobs abandoned on timeout still count against the queue
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=app.config['PASSWORD_HASH_TIMEOUT'])
+        except TimeoutError:
+            raise HasherBusy('Password hashing timed out')
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, app.config['PASSWORD_HASH_METHOD'])
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    # A hash made with other parameters than the configured ones should be replaced on next login
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != normalize_method(app.config['PASSWORD_HASH_METHOD'])
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+            self._pid = None
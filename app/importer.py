@@ -0,0 +1,81 @@
+import json
+from datetime import datetime, timezone
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.http import parse_date
+from app import db
+from app.models import User, BlogPost
+from app.caching import bump_user_version
+from app.validators import validate_post_fields
+
+# Function to parse the optional timestamp of an imported post. Accepts the HTTP date
+# format produced by GET /posts/export as well as ISO 8601; stored as naive UTC.
+def parse_timestamp(value):
+    if value is None:
+        return datetime.utcnow()
+    if not isinstance(value, str):
+        raise ValueError('Timestamp must be a string')
+    timestamp = parse_date(value)
+    if timestamp is None:
+        timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+# Function to import posts for a user from an iterable of NDJSON lines (str or bytes).
+# Valid records are inserted with executemany and committed every chunk_size records;
+# invalid lines and failed chunks are reported and skipped without aborting the import.
+def import_posts(lines, user_id, chunk_size=1000, max_errors=100):
+    summary = {'imported': 0, 'failed': 0, 'errors': []}
+    chunk = []
+    chunk_lines = []
+
+    def report(line_number, message, count=1):
+        summary['failed'] += count
+        if len(summary['errors']) < max_errors:
+            summary['errors'].append({'line': line_number, 'message': message})
+
+    def flush():
+        try:
+            db.session.execute(insert(BlogPost), chunk)
+            User.adjust_post_count(user_id, len(chunk))
+            db.session.commit()
+            summary['imported'] += len(chunk)
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            report(chunk_lines[0], f'Database error in lines {chunk_lines[0]}-{chunk_lines[-1]}: {e}', count=len(chunk))
+        chunk.clear()
+        chunk_lines.clear()
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            report(line_number, 'Invalid JSON')
+            continue
+        if not isinstance(record, dict):
+            report(line_number, 'Post must be a JSON object')
+            continue
+
+        error = validate_post_fields(record.get('title'), record.get('body'))
+        if error:
+            report(line_number, error)
+            continue
+        try:
+            timestamp = parse_timestamp(record.get('timestamp'))
+        except ValueError:
+            report(line_number, 'Invalid timestamp')
+            continue
+
+        chunk.append({'title': record['title'], 'body': record['body'], 'timestamp': timestamp, 'user_id': user_id})
+        chunk_lines.append(line_number)
+        if len(chunk) >= chunk_size:
+            flush()
+
+    if chunk:
+        flush()
+    if summary['imported']:
+        bump_user_version('posts', user_id)
+    return summary
@@ -0,0 +1,78 @@
+import json
+import re
+import uuid
+from datetime import datetime, timezone
+from flask.json.provider import DefaultJSONProvider
+
+# orjson is optional; the standard library encoder is always available
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+# Same output as werkzeug's http_date(), which Flask uses for datetimes, without going
+# through email.utils; naive datetimes are taken as UTC
+def http_date(value):
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return (f'{DAYS[value.weekday()]}, {value.day:02d} {MONTHS[value.month - 1]} {value.year:04d} '
+            f'{value.hour:02d}:{value.minute:02d}:{value.second:02d} GMT')
+
+# Already encoded JSON (str or UTF-8 bytes) inserted as is into the output, e.g. a cached
+# sub-document that would otherwise be decoded only to be encoded again
+class Fragment:
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data.decode('utf-8') if isinstance(data, bytes) else data
+
+# JSON provider of the app: orjson when installed, else the standard library, with
+# Fragment support and fast datetime formatting. Output matches Flask's default
+# provider (sorted keys, compact unless debugging, HTTP dates).
+class JSONProvider(DefaultJSONProvider):
+    accelerated = orjson is not None
+
+    # Encode obj to UTF-8 JSON bytes
+    def encode(self, obj, **kwargs):
+        fragments = []
+        token = []
+
+        def default(value):
+            if isinstance(value, datetime):
+                return http_date(value)
+            if isinstance(value, Fragment):
+                # Placeholder string, swapped for the fragment once everything is encoded.
+                # The per-call token keeps user data from ever matching a placeholder.
+                if not token:
+                    token.append(uuid.uuid4().hex)
+                fragments.append(value.data)
+                return f'\x00{token[0]}:{len(fragments) - 1}\x00'
+            return self.default(value)
+
+        if self.accelerated and not kwargs:
+            option = orjson.OPT_PASSTHROUGH_DATETIME | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+            data = orjson.dumps(obj, default=default, option=option)
+        else:
+            kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+            kwargs.setdefault('sort_keys', self.sort_keys)
+            if 'indent' not in kwargs:
+                kwargs.setdefault('separators', (',', ':'))
+            data = json.dumps(obj, default=default, **kwargs).encode('utf-8')
+
+        if fragments:
+            pattern = re.compile(rb'"\\u0000' + token[0].encode('ascii') + rb':(\d+)\\u0000"')
+            data = pattern.sub(lambda match: fragments[int(match.group(1))].encode('utf-8'), data)
+        return data
+
+    def dumps(self, obj, **kwargs):
+        return self.encode(obj, **kwargs).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        # Pretty-printed output in debug mode, as with the default provider
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return self._app.response_class(f'{self.dumps(obj, indent=2)}\n', mimetype=self.mimetype)
+        return self._app.response_class(self.encode(obj) + b'\n', mimetype=self.mimetype)
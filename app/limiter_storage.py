@@ -0,0 +1,141 @@
+import math
+import random
+import sqlite3
+import time
+from limits.storage import Storage, MovingWindowSupport
+from app.sqlite_local import LocalConnection, check_private
+
+# Rate limit storage for Flask-Limiter shared by every worker process on a host.
+# Counters live in a SQLite database in WAL mode, so there is nothing extra to run:
+# point RATELIMIT_STORAGE_URI at sqlite:///relative/path or sqlite:////absolute/path.
+# The file must be private to the app's user (see check_private), or anyone able to
+# write it could reset or forge counters.
+#
+# The moving-window strategy is served by a sliding window counter rather than a log
+# of hits: each key keeps the count of the current and the previous fixed window and
+# weights the previous one by how much of it still overlaps the moving window. That
+# keeps every check to one row and one short transaction regardless of the limit size,
+# at the cost of assuming hits in the previous window were evenly spread.
+class SQLiteStorage(Storage, MovingWindowSupport):
+    STORAGE_SCHEME = ['sqlite']
+
+    # One expired-row sweep per this many writes on average
+    PURGE_EVERY = 1000
+
+    def __init__(self, uri, wrap_exceptions=False, timeout=5.0, **options):
+        path = uri.split('://', 1)[1][1:]
+        if not path or path == ':memory:':
+            raise ValueError('SQLiteStorage needs a database file shared by the worker processes')
+        check_private(path)
+        self._connection = LocalConnection(path, timeout).get
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self._connection().executescript('''
+            CREATE TABLE IF NOT EXISTS counters (
+                key TEXT PRIMARY KEY, value INTEGER NOT NULL, expiry REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS windows (
+                key TEXT PRIMARY KEY, window_start REAL NOT NULL, current INTEGER NOT NULL,
+                previous INTEGER NOT NULL, expiry REAL NOT NULL);
+        ''')
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _maybe_purge(self, connection, now):
+        if random.randrange(self.PURGE_EVERY) == 0:
+            connection.execute('DELETE FROM counters WHERE expiry <= ?', (now,))
+            connection.execute('DELETE FROM windows WHERE expiry <= ?', (now,))
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        now = time.time()
+        connection = self._connection()
+        # A single atomic upsert: restart expired counters, otherwise add to them
+        value = connection.execute('''
+            INSERT INTO counters (key, value, expiry) VALUES (:key, :amount, :now + :ttl)
+            ON CONFLICT (key) DO UPDATE SET
+                value = CASE WHEN expiry <= :now THEN :amount ELSE value + :amount END,
+                expiry = CASE WHEN expiry <= :now OR :elastic THEN :now + :ttl ELSE expiry END
+            RETURNING value
+        ''', {'key': key, 'amount': amount, 'now': now, 'ttl': expiry, 'elastic': bool(elastic_expiry)}).fetchone()[0]
+        self._maybe_purge(connection, now)
+        return value
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value FROM counters WHERE key = ? AND expiry > ?', (key, time.time())).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        row = self._connection().execute('SELECT expiry FROM counters WHERE key = ?', (key,)).fetchone()
+        return int(row[0] if row else time.time())
+
+    def check(self):
+        try:
+            self._connection().execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        connection = self._connection()
+        cleared = connection.execute('DELETE FROM counters').rowcount
+        cleared += connection.execute('DELETE FROM windows').rowcount
+        return cleared
+
+    def clear(self, key):
+        connection = self._connection()
+        connection.execute('DELETE FROM counters WHERE key = ?', (key,))
+        connection.execute('DELETE FROM windows WHERE key = ?', (key,))
+
+    # Return (current, previous) counts for the fixed window starting at window_start,
+    # rolling the stored counts forward if one or more windows have passed
+    @staticmethod
+    def _shift(row, window_start, expiry):
+        if row is None:
+            return 0, 0
+        stored_start, current, previous = row
+        if stored_start == window_start:
+            return current, previous
+        if stored_start == window_start - expiry:
+            return 0, current
+        return 0, 0
+
+    @staticmethod
+    def _weighted(now, window_start, expiry, current, previous):
+        return previous * (1 - (now - window_start) / expiry) + current
+
+    def acquire_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        now = time.time()
+        window_start = math.floor(now / expiry) * expiry
+        connection = self._connection()
+        # BEGIN IMMEDIATE takes the write lock up front so read-check-write is atomic across processes
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT window_start, current, previous FROM windows WHERE key = ?', (key,)).fetchone()
+            current, previous = self._shift(row, window_start, expiry)
+            if self._weighted(now, window_start, expiry, current, previous) + amount > limit:
+                connection.execute('COMMIT')
+                return False
+            connection.execute('''
+                INSERT INTO windows (key, window_start, current, previous, expiry) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    window_start = excluded.window_start, current = excluded.current,
+                    previous = excluded.previous, expiry = excluded.expiry
+            ''', (key, window_start, current + amount, previous, window_start + 2 * expiry))
+            self._maybe_purge(connection, now)
+            connection.execute('COMMIT')
+            return True
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def get_moving_window(self, key, limit, expiry):
+        now = time.time()
+        window_start = math.floor(now / expiry) * expiry
+        row = self._connection().execute(
+            'SELECT window_start, current, previous FROM windows WHERE key = ?', (key,)).fetchone()
+        current, previous = self._shift(row, window_start, expiry)
+        return int(window_start), math.ceil(self._weighted(now, window_start, expiry, current, previous))
@@ -0,0 +1,164 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from flask import g, request, has_request_context, current_app as app
+from flask.logging import default_handler
+from flask_jwt_extended import get_jwt_identity
+
+# Incoming X-Request-ID values are reused only if they look like an id
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# Attributes of a LogRecord that are copied into the JSON document when present
+CONTEXT_FIELDS = ('request_id', 'user_id', 'method', 'route', 'status', 'latency_ms')
+
+# Formats records as one JSON document per line
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        document = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'message': record.getMessage(),
+            'logger': record.name,
+            'location': f'{record.pathname}:{record.lineno}',
+        }
+        for name in CONTEXT_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                document[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            document['exception'] = record.exc_text
+        return json.dumps(document, default=str)
+
+# Hands records to the listener thread. The stdlib prepare() formats the message with the
+# default formatter, appending the traceback to it, and drops exc_info; this one only merges
+# the arguments into the message and keeps the traceback in exc_text, so JSONFormatter can
+# still report it in its own 'exception' field.
+class JSONQueueHandler(QueueHandler):
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+# Attaches the request id, user, route and time spent so far to records logged during a
+# request. It runs on the request thread, before the record is handed to the queue.
+class RequestContextFilter(logging.Filter):
+    def filter(self, record):
+        if not has_request_context():
+            return True
+        record.request_id = g.get('request_id')
+        record.method = request.method
+        record.route = request.url_rule.rule if request.url_rule else request.path
+        if getattr(record, 'latency_ms', None) is None and 'request_start' in g:
+            record.latency_ms = round((time.perf_counter() - g.request_start) * 1000, 3)
+        try:
+            record.user_id = get_jwt_identity()
+        except RuntimeError:
+            record.user_id = None
+        return True
+
+# Keeps only a fraction of the INFO records whose message template is listed,
+# e.g. the "retrieved successfully" line written by every read
+class SamplingFilter(logging.Filter):
+    def __init__(self, messages, rate):
+        super().__init__()
+        self.messages = frozenset(messages)
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno != logging.INFO or record.msg not in self.messages:
+            return True
+        return random.random() < self.rate
+
+# Non-blocking application logging. Request threads only put records on an in-memory
+# queue; a QueueListener thread formats them as JSON and writes them to a file rotated
+# by size in megabytes, so rotation never happens on the request path. Every request
+# gets an id (reused from X-Request-ID when valid) and ends with one access line
+# carrying its status and latency.
+class RequestLogging:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pipelines = []
+        os.register_at_fork(after_in_child=self._restart_after_fork)
+        atexit.register(self.stop)
+
+    def init_app(self, app):
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+        if not app.debug and not app.testing:
+            log_dir = os.path.dirname(app.config['LOG_FILE'])
+            if log_dir:
+                os.makedirs(log_dir, exist_ok=True)
+            file_handler = RotatingFileHandler(
+                app.config['LOG_FILE'],
+                maxBytes=app.config['LOG_MAX_MB'] * 1024 * 1024,
+                backupCount=app.config['LOG_BACKUP_COUNT'])
+            file_handler.setLevel(logging.INFO)
+            self.attach(app, file_handler)
+            # Flask's stderr handler would still write synchronously on the request thread
+            app.logger.removeHandler(default_handler)
+
+            app.logger.setLevel(logging.INFO)
+            app.logger.info('Blog API startup')
+
+    # Route app.logger through a queue to `handler`, which is driven by a listener thread
+    def attach(self, app, handler):
+        handler.setFormatter(JSONFormatter())
+        log_queue = queue.SimpleQueue()
+        queue_handler = JSONQueueHandler(log_queue)
+        queue_handler.addFilter(SamplingFilter(app.config['LOG_SAMPLED_MESSAGES'], app.config['LOG_SAMPLE_RATE']))
+        queue_handler.addFilter(RequestContextFilter())
+        listener = QueueListener(log_queue, handler, respect_handler_level=True)
+        listener.start()
+        app.logger.addHandler(queue_handler)
+        with self._lock:
+            self._pipelines.append((queue_handler, listener))
+        return queue_handler
+
+    # Threads do not survive a fork: give each child its own queue and listener thread
+    def _restart_after_fork(self):
+        self._lock = threading.Lock()
+        for queue_handler, listener in self._pipelines:
+            queue_handler.queue = listener.queue = queue.SimpleQueue()
+            listener._thread = None
+            listener.start()
+
+    # Flush queued records and stop the listener threads
+    def stop(self):
+        with self._lock:
+            pipelines, self._pipelines = self._pipelines, []
+        for queue_handler, listener in pipelines:
+            if listener._thread is not None:
+                listener.stop()
+
+    def _start_request(self):
+        g.request_start = time.perf_counter()
+        request_id = request.headers.get('X-Request-ID', '')
+        g.request_id = request_id if REQUEST_ID_PATTERN.match(request_id) else uuid.uuid4().hex
+
+    def _finish_request(self, response):
+        if 'request_id' in g:
+            response.headers['X-Request-ID'] = g.request_id
+            app.logger.info('Request completed', extra={
+                'status': response.status_code,
+                'latency_ms': round((time.perf_counter() - g.request_start) * 1000, 3),
+            })
+        return response
+
+request_logging = RequestLogging()
@@ -0,0 +1,266 @@
+import bisect
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from flask import g, request, has_request_context, current_app as app
+from sqlalchemy import event
+from app.private_files import private_directory, open_private
+
+# name -> (type, help) of every metric this module records
+METRICS = {
+    'http_requests_total': ('counter', 'Requests handled, by route, method and status'),
+    'http_request_duration_seconds': ('histogram', 'Request latency, by route and method'),
+    'db_queries_total': ('counter', 'SQL statements executed, by route'),
+    'db_query_duration_seconds_total': ('counter', 'Time spent executing SQL statements, by route'),
+    'cache_requests_total': ('counter', 'Per-user response cache lookups, by namespace and result'),
+    'ratelimit_rejections_total': ('counter', 'Requests rejected by the rate limiter, by route'),
+    'group_commit_batch_size': ('histogram', 'Posts committed per group-commit transaction'),
+    'group_commit_batches_total': ('counter', 'Group-commit batches, by result (committed, or retried one post at a time after an error)'),
+}
+
+# Histograms measuring something else than seconds, with their own buckets; the others use METRICS_BUCKETS
+HISTOGRAM_BUCKETS = {
+    'group_commit_batch_size': (1, 2, 4, 8, 16, 32, 64, 128, 256),
+}
+
+# Route label for statements run outside a request (CLI commands, background work)
+NO_ROUTE = '(none)'
+
+def _route():
+    if not has_request_context():
+        return NO_ROUTE
+    return request.url_rule.rule if request.url_rule else '(unmatched)'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+# Request, SQL, cache and rate limit metrics in Prometheus text format.
+#
+# Each process records into plain dicts under a lock and, at most every
+# METRICS_FLUSH_INTERVAL seconds, dumps them to METRICS_DIR/metrics-<pid>.json.
+# /metrics merges the files of every worker, so any worker can answer a scrape;
+# other workers' numbers may lag by one flush interval. Files left by workers that
+# have exited are folded into archive.json so counters never go backwards.
+# Without METRICS_DIR only the serving process is reported. A relative METRICS_DIR is
+# taken from the instance folder; the directory must be private to the app's user.
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._last_flush = 0.0
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def init_app(self, app):
+        self._buckets = tuple(app.config['METRICS_BUCKETS'])
+        if app.config['METRICS_DIR']:
+            app.config['METRICS_DIR'] = os.path.join(app.instance_path, app.config['METRICS_DIR'])
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        with app.app_context():
+            from app import db
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+                event.listen(engine, 'handle_error', self._handle_error)
+
+    # A forked worker starts from zero; its parent's numbers are reported by the parent
+    def _reset_after_fork(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+            self._last_flush = 0.0
+
+    def inc(self, name, labels, amount=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def _buckets_of(self, name):
+        return HISTOGRAM_BUCKETS.get(name, self._buckets)
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        buckets = self._buckets_of(name)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(buckets), 0.0, 0]
+            index = bisect.bisect_left(buckets, value)
+            if index < len(buckets):
+                histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    # result is 'hit', 'stale' or 'miss'
+    def record_cache(self, namespace, result):
+        self.inc('cache_requests_total', (('namespace', namespace), ('result', result)))
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self._record_query(conn)
+
+    # after_cursor_execute does not run for failed statements (errors, timeouts); count
+    # them here so their start times do not pile up on the pooled connection
+    def _handle_error(self, exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get('metrics_query_start'):
+            self._record_query(conn)
+
+    def _record_query(self, conn):
+        elapsed = time.perf_counter() - conn.info['metrics_query_start'].pop()
+        labels = (('route', _route()),)
+        with self._lock:
+            for name, amount in (('db_queries_total', 1), ('db_query_duration_seconds_total', elapsed)):
+                key = (name, labels)
+                self._counters[key] = self._counters.get(key, 0) + amount
+
+    def _start_request(self):
+        g.metrics_start = time.perf_counter()
+
+    def _finish_request(self, response):
+        if 'metrics_start' not in g:
+            return response
+        route = _route()
+        self.observe('http_request_duration_seconds', (('route', route), ('method', request.method)),
+                     time.perf_counter() - g.metrics_start)
+        self.inc('http_requests_total', (('route', route), ('method', request.method), ('status', str(response.status_code))))
+        if response.status_code == 429:
+            self.inc('ratelimit_rejections_total', (('route', route),))
+        if time.monotonic() - self._last_flush >= app.config['METRICS_FLUSH_INTERVAL']:
+            try:
+                self.flush()
+            except OSError as e:
+                app.logger.warning('Could not write metrics: %s', e)
+        return response
+
+    @staticmethod
+    def _serialize(counters, histograms):
+        return {
+            'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+            'histograms': [[name, labels, list(buckets), total, count]
+                           for (name, labels), (buckets, total, count) in histograms.items()],
+        }
+
+    def _snapshot(self):
+        with self._lock:
+            return self._serialize(self._counters, self._histograms)
+
+    # Write this process's numbers to its file in METRICS_DIR (atomically, via rename)
+    def flush(self):
+        self._last_flush = time.monotonic()
+        directory = app.config['METRICS_DIR']
+        if not directory:
+            return
+        private_directory(directory)
+        path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open_private(tmp_path, 'w') as f:
+            json.dump(self._snapshot(), f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _merge(into, snapshot):
+        counters, histograms = into
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, buckets, total, count in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+            merged[1] += total
+            merged[2] += count
+
+    @staticmethod
+    def _alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    # Merge the files of every worker, folding those of exited workers into archive.json
+    def _collect(self, directory):
+        merged = ({}, {})
+        archive = ({}, {})
+        archive_path = os.path.join(directory, 'archive.json')
+        with open_private(os.path.join(directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if os.path.exists(archive_path):
+                with open_private(archive_path) as f:
+                    self._merge(archive, json.load(f))
+            dead = []
+            for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+                pid = int(os.path.basename(path)[len('metrics-'):-len('.json')])
+                try:
+                    with open_private(path) as f:
+                        snapshot = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                if pid != os.getpid() and not self._alive(pid):
+                    self._merge(archive, snapshot)
+                    dead.append(path)
+                else:
+                    self._merge(merged, snapshot)
+            if dead:
+                with open_private(archive_path + '.tmp', 'w') as f:
+                    json.dump(self._serialize(*archive), f)
+                os.replace(archive_path + '.tmp', archive_path)
+                for path in dead:
+                    os.remove(path)
+        self._merge(merged, self._serialize(*archive))
+        return merged
+
+    # Render every metric in the Prometheus text exposition format
+    def render(self):
+        directory = app.config['METRICS_DIR']
+        if directory:
+            self.flush()
+            counters, histograms = self._collect(directory)
+        else:
+            counters, histograms = ({}, {})
+            self._merge((counters, histograms), self._snapshot())
+
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+                continue
+            for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket in zip(self._buckets_of(name), buckets):
+                    cumulative += bucket
+                    lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {count}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+                lines.append(f'{name}_count{_format_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
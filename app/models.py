@@ -1,20 +1,39 @@
 from datetime import datetime
-from app import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from app import db, hasher
+from sqlalchemy import update, select, func, event, DDL
 
 # Define the User model
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)  # Primary key
     username = db.Column(db.String(64), unique=True, nullable=False)  # Unique username
     password_hash = db.Column(db.String(256), nullable=False)  # Password hash
+    tier = db.Column(db.String(32), nullable=False, default='standard', server_default='standard')  # Rate limit tier, see RATELIMIT_TIERS
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Denormalized number of posts owned by the user
 
-    # Method to set the user's password, storing the hash
+    # Method to set the user's password, storing the hash (computed in the hashing pool)
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hasher.hash(password)
 
-    # Method to check the user's password against the stored hash
+    # Method to check the user's password against the stored hash (verified in the hashing pool)
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return hasher.verify(self.password_hash, password)
+
+    # Method to tell whether the stored hash was made with other parameters than the configured ones
+    def password_needs_rehash(self):
+        return hasher.needs_rehash(self.password_hash)
+
+    # Method to adjust a user's post counter inside the current transaction
+    @staticmethod
+    def adjust_post_count(user_id, delta):
+        db.session.execute(update(User).where(User.id == user_id).values(post_count=User.post_count + delta))
+
+    # Method to rebuild every user's post counter from the blog_post table, returning the number of users fixed
+    @staticmethod
+    def reconcile_post_counts():
+        actual = select(func.count(BlogPost.id)).where(BlogPost.user_id == User.id).scalar_subquery()
+        result = db.session.execute(update(User).where(User.post_count != actual).values(post_count=actual))
+        db.session.commit()
+        return result.rowcount
 
 # Define the BlogPost model
 class BlogPost(db.Model):
@@ -23,6 +42,43 @@ class BlogPost(db.Model):
     body = db.Column(db.Text, nullable=False)  # Body of the blog post
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)  # Timestamp of when the post was created
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)  # Foreign key referencing the user
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)  # Timestamp of the last change, used as the row version for ETags
 
     # Establish a relationship between BlogPost and User models
     user = db.relationship('User', backref=db.backref('posts', lazy='dynamic'))
+
+    # Composite indexes backing keyset pagination of a user's posts by (timestamp, id)
+    # and the max(updated_at) lookup used for listing ETags
+    __table_args__ = (
+        db.Index('ix_blog_post_user_id_timestamp_id', 'user_id', 'timestamp', 'id'),
+        db.Index('ix_blog_post_user_id_updated_at', 'user_id', 'updated_at'),
+    )
+
+# Full-text index over title and body, created with the table (migrations create it on
+# existing databases). PostgreSQL keeps a generated, weighted tsvector column behind a GIN
+# index; SQLite keeps an FTS5 table over blog_post maintained by triggers. Neither is
+# mapped on the model; app/search.py queries them.
+SEARCH_DDL = {
+    'postgresql': [
+        "ALTER TABLE blog_post ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(body, '')), 'B')) STORED",
+        "CREATE INDEX ix_blog_post_search_vector ON blog_post USING GIN (search_vector)",
+    ],
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS blog_post_fts USING fts5("
+        "title, body, content='blog_post', content_rowid='id', tokenize='porter unicode61')",
+        "CREATE TRIGGER blog_post_fts_insert AFTER INSERT ON blog_post BEGIN "
+        "INSERT INTO blog_post_fts (rowid, title, body) VALUES (new.id, new.title, new.body); END",
+        "CREATE TRIGGER blog_post_fts_delete AFTER DELETE ON blog_post BEGIN "
+        "INSERT INTO blog_post_fts (blog_post_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); END",
+        "CREATE TRIGGER blog_post_fts_update AFTER UPDATE OF title, body ON blog_post BEGIN "
+        "INSERT INTO blog_post_fts (blog_post_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); "
+        "INSERT INTO blog_post_fts (rowid, title, body) VALUES (new.id, new.title, new.body); END",
+    ],
+}
+
+for dialect, statements in SEARCH_DDL.items():
+    for statement in statements:
+        event.listen(BlogPost.__table__, 'after_create', DDL(statement).execute_if(dialect=dialect))
+event.listen(BlogPost.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS blog_post_fts').execute_if(dialect='sqlite'))
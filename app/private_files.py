@@ -0,0 +1,43 @@
+import os
+import stat
+
+# Helpers for files that only the app's user may write (worker metrics, profile dumps).
+# A directory shared with other local users, such as /tmp, lets them plant files or
+# symlinks ahead of the app, so those are refused rather than trusted.
+
+# Create path (mode 0700) if missing and check that it is a real directory owned by this
+# user that nobody else can write to; raises PermissionError otherwise
+def private_directory(path):
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode):
+        raise PermissionError(f'Refusing directory {path}: not a directory')
+    if info.st_uid != os.geteuid():
+        raise PermissionError(f'Refusing directory {path}: owned by uid {info.st_uid}, not {os.geteuid()}')
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError(f'Refusing directory {path}: writable by other users')
+    return path
+
+# Open a file in a private directory without following symlinks, creating it with mode
+# 0600 when writing, and refuse it if another user owns it. mode is 'r' or 'w'.
+def open_private(path, mode='r'):
+    flags = os.O_RDONLY if mode == 'r' else os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+    fd = os.open(path, flags | os.O_NOFOLLOW | os.O_CLOEXEC, 0o600)
+    try:
+        owner = os.fstat(fd).st_uid
+        if owner != os.geteuid():
+            raise PermissionError(f'Refusing file {path}: owned by uid {owner}, not {os.geteuid()}')
+        return os.fdopen(fd, mode)
+    except BaseException:
+        os.close(fd)
+        raise
+
+# Names of the regular files in a private directory that belong to this user, sorted;
+# symlinks and files of other users are skipped
+def owned_files(directory):
+    names = []
+    for name in sorted(os.listdir(directory)):
+        info = os.lstat(os.path.join(directory, name))
+        if stat.S_ISREG(info.st_mode) and info.st_uid == os.geteuid():
+            names.append(name)
+    return names
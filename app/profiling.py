@@ -0,0 +1,187 @@
+import cProfile
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from flask import g, request, current_app as app
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from app.private_files import private_directory, owned_files
+
+PROFILE_SALT = 'profile'
+
+# Dump file extensions by profiler mode
+EXTENSIONS = {'cprofile': '.prof', 'sampler': '.collapsed'}
+
+# Low-overhead alternative to cProfile: a thread that looks at the request thread's
+# stack every `interval` seconds and counts identical stacks, in the collapsed format
+# read by flamegraph.pl and speedscope ("outer;inner;leaf count" per line)
+class StackSampler:
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.counts.most_common():
+                f.write(f'{stack} {count}\n')
+
+# Profiles live requests on demand. A request is profiled when it carries a valid
+# signed token in PROFILE_HEADER (see make_token and `flask profile-token`), or, with
+# PROFILE_ENABLED, for a random PROFILE_SAMPLE_RATE fraction of requests. Dumps are
+# written to PROFILE_DIR/<endpoint>/ as pstats (.prof) or collapsed stacks (.collapsed)
+# depending on PROFILE_MODE. Only token holders are told the dump's path, in an
+# X-Profile-File response header. A relative PROFILE_DIR is taken from the instance
+# folder and must be private to the app's user; each endpoint keeps its newest
+# PROFILE_MAX_FILES dumps.
+class Profiler:
+    def init_app(self, app):
+        app.config['PROFILE_DIR'] = os.path.join(app.instance_path, app.config['PROFILE_DIR'])
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    @staticmethod
+    def _serializer():
+        return URLSafeTimedSerializer(app.config['SECRET_KEY'], salt=PROFILE_SALT)
+
+    # Return a token that enables profiling for requests carrying it in PROFILE_HEADER
+    def make_token(self):
+        return self._serializer().dumps('profile')
+
+    # True when the current request carries a valid, unexpired profiling token
+    def authorized(self):
+        token = request.headers.get(app.config['PROFILE_HEADER'])
+        if not token:
+            return False
+        try:
+            self._serializer().loads(token, max_age=app.config['PROFILE_TOKEN_MAX_AGE'])
+            return True
+        except BadSignature:
+            return False
+
+    def _should_profile(self):
+        if self.authorized():
+            return True
+        return app.config['PROFILE_ENABLED'] and random.random() < app.config['PROFILE_SAMPLE_RATE']
+
+    def _start_request(self):
+        if request.url_rule is None or not self._should_profile():
+            return
+        if app.config['PROFILE_MODE'] == 'sampler':
+            profile = StackSampler(threading.get_ident(), app.config['PROFILE_SAMPLER_INTERVAL'])
+            profile.start()
+        else:
+            profile = cProfile.Profile()
+            profile.enable()
+        g.profile = profile
+
+    def _finish_request(self, response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        if isinstance(profile, StackSampler):
+            profile.stop()
+        else:
+            profile.disable()
+
+        directory = os.path.join(app.config['PROFILE_DIR'], request.url_rule.endpoint)
+        extension = EXTENSIONS['sampler' if isinstance(profile, StackSampler) else 'cprofile']
+        name = f'{time.strftime("%Y%m%dT%H%M%S")}-{os.getpid()}-{uuid.uuid4().hex[:8]}{extension}'
+        try:
+            private_directory(app.config['PROFILE_DIR'])
+            private_directory(directory)
+            path = os.path.join(directory, name)
+            if isinstance(profile, StackSampler):
+                profile.dump(path)
+            else:
+                profile.dump_stats(path)
+            if self.authorized():
+                response.headers['X-Profile-File'] = os.path.join(request.url_rule.endpoint, name)
+            self._prune(directory)
+        except OSError as e:
+            app.logger.warning('Could not write profile: %s', e)
+        return response
+
+    # Remove all but the newest PROFILE_MAX_FILES dumps of an endpoint (names start with
+    # their creation time); several workers may prune the same directory at once
+    @staticmethod
+    def _prune(directory):
+        limit = app.config['PROFILE_MAX_FILES']
+        names = sorted(os.listdir(directory))
+        for name in names[:max(len(names) - limit, 0)]:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+    # Describe the dumps in PROFILE_DIR, newest first, optionally for one endpoint
+    def list_profiles(self, endpoint=None):
+        root = app.config['PROFILE_DIR']
+        if not os.path.isdir(root):
+            return []
+        private_directory(root)
+        profiles = []
+        for route in sorted(os.listdir(root)):
+            if endpoint and route != endpoint:
+                continue
+            directory = os.path.join(root, route)
+            if os.path.islink(directory) or not os.path.isdir(directory):
+                continue
+            private_directory(directory)
+            for name in owned_files(directory):
+                stat = os.stat(os.path.join(directory, name))
+                profiles.append({
+                    'endpoint': route,
+                    'file': os.path.join(route, name),
+                    'format': 'pstats' if name.endswith(EXTENSIONS['cprofile']) else 'collapsed',
+                    'size': stat.st_size,
+                    'created': datetime.fromtimestamp(stat.st_mtime, timezone.utc).isoformat()
+                })
+        return sorted(profiles, key=lambda profile: profile['created'], reverse=True)
+
+# Merge pstats dumps into one file readable by pstats, snakeviz or gprof2dot
+def merge_pstats(paths, output):
+    stats = pstats.Stats(paths[0])
+    for path in paths[1:]:
+        stats.add(path)
+    stats.dump_stats(output)
+
+# Merge collapsed-stack dumps by summing the sample counts of identical stacks
+def merge_collapsed(paths, output):
+    counts = Counter()
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack:
+                    counts[stack] += int(count)
+    with open(output, 'w') as f:
+        for stack, count in counts.most_common():
+            f.write(f'{stack} {count}\n')
+
+profiler = Profiler()
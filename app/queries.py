@@ -0,0 +1,46 @@
+from math import ceil
+from sqlalchemy import select, tuple_
+from app import db
+from app.models import BlogPost
+
+# Read-only queries of the post endpoints. They select plain columns of the blog_post
+# table with Core, so results are lightweight Row tuples: no BlogPost instances, no
+# identity map and no attribute instrumentation. Writes keep using the ORM.
+posts = BlogPost.__table__
+
+# Columns for the requested fields in that order, followed by the extra columns; rows
+# can then be serialized with serialize_row(row, fields)
+def post_columns(fields, *extra):
+    return [posts.c[name] for name in fields] + [posts.c[name] for name in extra if name not in fields]
+
+# Function to turn a row selected with post_columns(fields, ...) into its JSON representation
+def serialize_row(row, fields):
+    return dict(zip(fields, row))
+
+# A user's posts newest first, with id as a tie-breaker so pages are deterministic
+def _user_posts(user_id, fields, *extra):
+    return (select(*post_columns(fields, *extra))
+            .where(posts.c.user_id == user_id)
+            .order_by(posts.c.timestamp.desc(), posts.c.id.desc()))
+
+# Up to `limit` posts of a user after the keyset position (timestamp, id), if any. The
+# timestamp and id are always selected because the next cursor is built from them.
+def list_posts_after(user_id, fields, limit, position=None):
+    query = _user_posts(user_id, fields, 'timestamp', 'id').limit(limit)
+    if position:
+        query = query.where(tuple_(posts.c.timestamp, posts.c.id) < tuple_(*position))
+    return db.session.execute(query).all()
+
+# One page of a user's posts, out of `total` posts. Page and per_page are corrected the
+# way Flask-SQLAlchemy's paginate(error_out=False) does. Returns (rows, page, per_page, pages).
+def page_posts(user_id, fields, page, per_page, total):
+    page = page if page >= 1 else 1
+    per_page = per_page if per_page >= 1 else 20
+    query = _user_posts(user_id, fields).limit(per_page).offset((page - 1) * per_page)
+    pages = ceil(total / per_page) if total else 0
+    return db.session.execute(query).all(), page, per_page, pages
+
+# A user's post with its row version (updated_at), or None if missing or owned by someone else
+def get_post_row(post_id, user_id, fields):
+    query = select(*post_columns(fields, 'updated_at')).where(posts.c.id == post_id, posts.c.user_id == user_id)
+    return db.session.execute(query).first()
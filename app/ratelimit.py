@@ -0,0 +1,42 @@
+from flask import current_app as app
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from flask_limiter.util import get_remote_address
+from limits import parse
+from app import limiter
+
+# Function to key a rate limit on the authenticated user, so users behind one NAT get
+# their own buckets and one user cannot spread load across addresses. Falls back to the
+# client address when the request carries no verified JWT.
+def identity_key():
+    try:
+        return f'user:{get_jwt_identity()}'
+    except RuntimeError:
+        return get_remote_address()
+
+# Function to return the rate limit tier of the caller, taken from the token's 'tier' claim
+def current_tier():
+    try:
+        return get_jwt().get('tier', app.config['RATELIMIT_DEFAULT_TIER'])
+    except RuntimeError:
+        return app.config['RATELIMIT_DEFAULT_TIER']
+
+# Function to look up the limit of a bucket for the caller's tier in RATELIMIT_TIERS
+def tier_limit(bucket):
+    tiers = app.config['RATELIMIT_TIERS']
+    limits = tiers.get(current_tier()) or tiers[app.config['RATELIMIT_DEFAULT_TIER']]
+    return limits[bucket]
+
+# Function to return the largest cost a single request can be charged in a bucket for the
+# caller's tier; a request costing more would be rejected even with a full budget
+def tier_max_cost(bucket):
+    return parse(tier_limit(bucket)).amount
+
+# Decorator charging `cost` units against the caller's per-user budget for a bucket.
+# All routes declaring the same bucket share that budget; cost may be a callable
+# evaluated per request (e.g. the number of posts in a batch).
+def rate_limit(bucket, cost=1):
+    return limiter.shared_limit(lambda: tier_limit(bucket), scope=bucket, key_func=identity_key, cost=cost)
+
+# Decorator for anonymous endpoints (/signup, /login), limited per client address
+def auth_rate_limit():
+    return limiter.limit(lambda: app.config['RATELIMIT_AUTH_LIMIT'], key_func=get_remote_address)
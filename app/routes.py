@@ -1,9 +1,25 @@
-from flask import Blueprint, request, jsonify, current_app as app
-from app import db, cache, limiter
+from flask import Blueprint, Response, request, jsonify, stream_with_context, current_app as app
+from app import db
 from app.models import User, BlogPost
+from app.caching import cached_per_user, bump_user_version, stats as cache_stats
+from app.validators import validate_post_field, validate_post_fields
+from app.importer import import_posts
+from app.hashing import HasherBusy
+from app.ratelimit import rate_limit, auth_rate_limit, tier_max_cost
+from app.metrics import metrics
+from app.database import read_replica, stick_to_primary
+from app.group_commit import group_committer, GroupCommitTimeout
+from app.search import search_posts, render_highlight
+from app.queries import list_posts_after, page_posts, get_post_row, serialize_row
+from app.profiling import profiler
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from sqlalchemy import func, select, insert, update, delete
 from sqlalchemy.exc import SQLAlchemyError
 from werkzeug.exceptions import BadRequest, Forbidden
+from datetime import datetime
+import base64
+import hashlib
+import json
 import re
 
 # Create a Blueprint for the routes
@@ -19,13 +35,93 @@ def validate_password(password):
     min_length = app.config['PASSWORD_MIN_LENGTH']
     return len(password) >= min_length
 
+# Function to update the given columns of a user's post with a single UPDATE ... RETURNING.
+# Returns False when no row matched, i.e. the post is missing or owned by someone else.
+def update_post_values(post_id, user_id, values):
+    result = db.session.execute(
+        update(BlogPost).where(BlogPost.id == post_id, BlogPost.user_id == user_id).values(**values).returning(BlogPost.id))
+    if result.first() is None:
+        db.session.rollback()
+        return False
+    db.session.commit()
+    bump_user_version('posts', user_id)
+    return True
+
+# Function to compute the rate limit cost of a batch request, charged per post
+def batch_cost():
+    data = request.get_json(silent=True)
+    if isinstance(data, list) and 0 < len(data) <= batch_max_size():
+        return len(data)
+    return 1
+
+# Function to return the most posts the caller may send in one batch: POSTS_BATCH_MAX_SIZE,
+# or less when the caller's write budget is smaller (such a batch could never be charged)
+def batch_max_size():
+    return min(app.config['POSTS_BATCH_MAX_SIZE'], tier_max_cost('write'))
+
+# Function to encode the position of a post into an opaque pagination cursor
+def encode_cursor(post):
+    raw = json.dumps([post.timestamp.isoformat(), post.id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+# Function to decode a pagination cursor back into a (timestamp, id) pair
+def decode_cursor(cursor):
+    try:
+        timestamp, post_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(timestamp), int(post_id)
+    except (ValueError, TypeError):
+        raise BadRequest('Invalid cursor')
+
+# Function to encode the position of a search result into an opaque pagination cursor
+def encode_search_cursor(row):
+    raw = json.dumps([row.score, row.id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+# Function to decode a search cursor back into a (score, id) pair
+def decode_search_cursor(cursor):
+    try:
+        score, post_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return float(score), int(post_id)
+    except (ValueError, TypeError):
+        raise BadRequest('Invalid cursor')
+
+# Fields of a post that can be returned by the read endpoints
+POST_FIELDS = ('id', 'title', 'body', 'timestamp')
+
+# Function to parse the ?fields= parameter into the tuple of post fields to return
+def parse_fields():
+    raw = request.args.get('fields')
+    if raw is None:
+        return POST_FIELDS
+    fields = tuple(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in POST_FIELDS]
+    if not fields or unknown:
+        raise BadRequest(f'Invalid fields; allowed fields are {", ".join(POST_FIELDS)}')
+    return fields
+
+# Function to build a strong ETag from the version components of a resource
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+# Function to return a bodiless 304 response if the client already holds the given ETag, else None
+def not_modified(etag):
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = app.response_class(status=304)
+    response.set_etag(etag)
+    return response
+
+# Function to convert a blog post into its JSON representation
+def serialize_post(post, fields=POST_FIELDS):
+    return {name: getattr(post, name) for name in fields}
+
 # Route for user signup
 @bp.route('/signup', methods=['POST'])
-@limiter.limit("10 per minute") # Rate limiting
+@auth_rate_limit() # Rate limiting by client address
 def signup():
     try:
         data = request.get_json()
-        if not data:
+        if not data or not isinstance(data, dict):
             raise BadRequest('Invalid JSON data')
 
         email = data.get('email')
@@ -61,17 +157,20 @@ def signup():
         db.session.rollback()
         app.logger.error('Database error: %s', e)
         return jsonify({'message': 'Database error occurred', 'details': str(e)}), 500
+    except HasherBusy as e:
+        app.logger.warning('Password hashing unavailable: %s', e)
+        return jsonify({'message': 'Server is busy, please retry shortly'}), 503, {'Retry-After': '1'}
     except Exception as e:
         app.logger.error('Unexpected error: %s', e)
         return jsonify({'message': 'An unexpected error occurred', 'details': str(e)}), 500
 
 # Route for user login
 @bp.route('/login', methods=['POST'])
-@limiter.limit("10 per minute")
+@auth_rate_limit() # Rate limiting by client address
 def login():
     try:
         data = request.get_json()
-        if not data:
+        if not data or not isinstance(data, dict):
             raise BadRequest('Invalid JSON data')
 
         email = data.get('email')
@@ -90,12 +189,21 @@ def login():
             app.logger.warning('Invalid credentials')
             return jsonify({'message': 'Invalid credentials'}), 401
 
-        access_token = create_access_token(identity=user.id)
+        # Upgrade hashes made with older or weaker parameters while the plain password is at hand
+        if user.password_needs_rehash():
+            user.set_password(password)
+            db.session.commit()
+            app.logger.info('Password rehashed for user: %s', user.id)
+
+        access_token = create_access_token(identity=user.id, additional_claims={'tier': user.tier})
         app.logger.info('User logged in successfully')
         return jsonify(access_token=access_token), 200
     except BadRequest as e:
         app.logger.error('Bad request: %s', e)
         return jsonify({'message': str(e)}), 400
+    except HasherBusy as e:
+        app.logger.warning('Password hashing unavailable: %s', e)
+        return jsonify({'message': 'Server is busy, please retry shortly'}), 503, {'Retry-After': '1'}
     except Exception as e:
         app.logger.error('Unexpected error: %s', e)
         return jsonify({'message': 'An unexpected error occurred', 'details': str(e)}), 500
@@ -103,7 +211,7 @@ def login():
 # Route to create a new blog post
 @bp.route('/posts', methods=['POST'])
 @jwt_required() # JWT authentication required
-@limiter.limit("5 per minute") # Rate limiting
+@rate_limit('write') # Rate limiting per user
 def create_post():
     try:
         user_id = get_jwt_identity()
@@ -112,23 +220,89 @@ def create_post():
             return jsonify({'message': 'User not authorized'}), 403
 
         data = request.get_json()
-        if not data:
+        if not data or not isinstance(data, dict):
             raise BadRequest('Invalid JSON data')
 
         title = data.get('title')
         body = data.get('body')
         user_id = get_jwt_identity()
 
-        if not title or not body:
-            app.logger.warning('Title and body are required')
-            return jsonify({'message': 'Title and body are required'}), 400
+        error = validate_post_fields(title, body)
+        if error:
+            app.logger.warning(error)
+            return jsonify({'message': error}), 400
+
+        if app.config['GROUP_COMMIT_ENABLED']:
+            # Committed by the group committer thread together with concurrent creations
+            post_id = group_committer.create_post(title, body, user_id)
+            stick_to_primary(user_id)
+        else:
+            post = BlogPost(title=title, body=body, user_id=user_id)
+            db.session.add(post)
+            User.adjust_post_count(user_id, 1)
+            db.session.commit()
+            post_id = post.id
+        bump_user_version('posts', user_id)
 
-        post = BlogPost(title=title, body=body, user_id=user_id)
-        db.session.add(post)
+        app.logger.info('Post created successfully')
+        return jsonify({'message': 'Post created successfully','id': post_id}), 201
+    except BadRequest as e:
+        app.logger.error('Bad request: %s', e)
+        return jsonify({'message': str(e)}), 400
+    except GroupCommitTimeout as e:
+        # The post may still be committed, so tell the client to check before creating it again
+        app.logger.warning('Group commit unavailable: %s', e)
+        return jsonify({'message': 'Post creation timed out; the post may already exist, check before retrying'}), 503, {'Retry-After': '1'}
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        app.logger.error('Database error: %s', e)
+        return jsonify({'message': 'Database error occurred', 'details': str(e)}), 500
+    except Exception as e:
+        app.logger.error('Unexpected error: %s', e)
+        return jsonify({'message': 'An unexpected error occurred', 'details': str(e)}), 500
+
+# Route to create several blog posts in a single request
+@bp.route('/posts/batch', methods=['POST'])
+@jwt_required() # JWT authentication required
+@rate_limit('write', cost=batch_cost) # Rate limiting per user, charged per post
+def create_posts_batch():
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json()
+        if not isinstance(data, list) or not data:
+            raise BadRequest('Expected a non-empty JSON array of posts')
+
+        max_size = batch_max_size()
+        if len(data) > max_size:
+            app.logger.warning('Batch too large: %s posts', len(data))
+            return jsonify({'message': f'A batch may contain at most {max_size} posts'}), 400
+
+        # Validate every post up front so the batch is inserted all or nothing
+        rows = []
+        errors = []
+        for index, item in enumerate(data):
+            if not isinstance(item, dict):
+                errors.append({'index': index, 'message': 'Post must be a JSON object'})
+                continue
+            error = validate_post_fields(item.get('title'), item.get('body'))
+            if error:
+                errors.append({'index': index, 'message': error})
+                continue
+            rows.append({'title': item['title'], 'body': item['body'], 'user_id': user_id})
+
+        if errors:
+            app.logger.warning('Invalid posts in batch: %s', len(errors))
+            return jsonify({'message': 'Invalid posts in batch', 'errors': errors}), 400
+
+        # A single multi-row INSERT ... RETURNING, with ids returned in input order
+        result = db.session.execute(insert(BlogPost).returning(BlogPost.id, sort_by_parameter_order=True), rows)
+        ids = result.scalars().all()
+        User.adjust_post_count(user_id, len(ids))
         db.session.commit()
+        bump_user_version('posts', user_id)
 
-        app.logger.info('Post created successfully')
-        return jsonify({'message': 'Post created successfully','id': post.id}), 201
+        app.logger.info('Posts created successfully: %s', len(ids))
+        return jsonify({'message': 'Posts created successfully', 'ids': ids}), 201
     except BadRequest as e:
         app.logger.error('Bad request: %s', e)
         return jsonify({'message': str(e)}), 400
@@ -140,34 +314,155 @@ def create_post():
         app.logger.error('Unexpected error: %s', e)
         return jsonify({'message': 'An unexpected error occurred', 'details': str(e)}), 500
 
+# Route to import blog posts from a newline-delimited JSON request body
+@bp.route('/posts/import', methods=['POST'])
+@jwt_required() # JWT authentication required
+@rate_limit('bulk') # Rate limiting per user
+def import_posts_ndjson():
+    try:
+        user_id = get_jwt_identity()
+        chunk_size = request.args.get('chunk_size', app.config['IMPORT_CHUNK_SIZE'], type=int)
+        if chunk_size < 1:
+            raise BadRequest('chunk_size must be a positive integer')
+
+        # The body is read line by line from the request stream rather than buffered
+        summary = import_posts(request.stream, user_id, chunk_size=chunk_size)
+
+        app.logger.info('Posts imported: %s imported, %s failed', summary['imported'], summary['failed'])
+        return jsonify(summary)
+    except BadRequest as e:
+        app.logger.error('Bad request: %s', e)
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        app.logger.error('Unexpected error: %s', e)
+        return jsonify({'message': 'An unexpected error occurred', 'details': str(e)}), 500
+
 # Route to get all blog posts for the logged-in user
 @bp.route('/posts', methods=['GET'])
 @jwt_required()  # JWT authentication required
-@cache.cached(timeout=60, query_string=True) # Caching
+@rate_limit('read') # Rate limiting per user; usually served from the cache, so the cheapest read
+@cached_per_user(timeout=60, namespace='posts') # Per-user caching, invalidated on writes
+@read_replica # Served from a replica unless the user just wrote
 def get_posts():
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
+        cursor = request.args.get('cursor')
+        position = decode_cursor(cursor) if cursor else None
+        fields = parse_fields()
         user_id = get_jwt_identity()
 
-        pagination = BlogPost.query.filter_by(user_id=user_id).paginate(page=page, per_page=per_page, error_out=False)
-        posts = pagination.items
-
-        data = [{
-            'id': post.id,
-            'title': post.title,
-            'body': post.body,
-            'timestamp': post.timestamp
-        } for post in posts]
-
+        # The listing version is the user's post counter plus the latest updated_at, both
+        # read in one indexed lookup; an unchanged version answers 304 without loading posts.
+        # A token whose user no longer exists gets an empty listing.
+        total, last_updated = db.session.query(
+            User.post_count,
+            select(func.max(BlogPost.updated_at)).where(BlogPost.user_id == User.id).scalar_subquery()
+        ).filter(User.id == user_id).one_or_none() or (0, None)
+        etag = make_etag('posts', user_id, total, last_updated, sorted(request.args.items(multi=True)))
+        response = not_modified(etag)
+        if response is not None:
+            return response
+
+        if cursor is not None:
+            # Keyset mode: seek past the last post of the previous page instead of
+            # scanning an OFFSET, and skip the COUNT(*) query entirely
+            per_page = max(per_page, 1)
+            rows = list_posts_after(user_id, fields, per_page + 1, position)
+            next_cursor = encode_cursor(rows[per_page - 1]) if len(rows) > per_page else None
+
+            app.logger.info('Posts retrieved successfully')
+            response = jsonify({
+                'posts': [serialize_row(row, fields) for row in rows[:per_page]],
+                'next_cursor': next_cursor,
+                'per_page': per_page
+            })
+            response.set_etag(etag)
+            return response
+
+        # Totals come from the maintained counter on User rather than a COUNT(*) per page
+        rows, page, per_page, pages = page_posts(user_id, fields, page, per_page, total)
         app.logger.info('Posts retrieved successfully')
+        response = jsonify({
+            'posts': [serialize_row(row, fields) for row in rows],
+            'total': total,
+            'pages': pages,
+            'current_page': page,
+            'per_page': per_page
+        })
+        response.set_etag(etag)
+        return response
+    except BadRequest as e:
+        app.logger.error('Bad request: %s', e)
+        return jsonify({'message': str(e)}), 400
+    except SQLAlchemyError as e:
+        app.logger.error('Database error: %s', e)
+        return jsonify({'message': 'Database error occurred', 'details': str(e)}), 500
+    except Exception as e:
+        app.logger.error('Unexpected error: %s', e)
+        return jsonify({'message': 'An unexpected error occurred', 'details': str(e)}), 500
+
+# Route to export all blog posts of the logged-in user as newline-delimited JSON
+@bp.route('/posts/export', methods=['GET'])
+@jwt_required()  # JWT authentication required
+@rate_limit('bulk') # Rate limiting per user
+def export_posts():
+    user_id = get_jwt_identity()
+    # yield_per streams rows from a server-side cursor in fixed-size chunks, so
+    # memory stays flat however many posts the user has
+    query = (select(BlogPost.id, BlogPost.title, BlogPost.body, BlogPost.timestamp)
+             .where(BlogPost.user_id == user_id)
+             .order_by(BlogPost.timestamp.desc(), BlogPost.id.desc())
+             .execution_options(yield_per=app.config['EXPORT_CHUNK_SIZE']))
+
+    def generate():
+        try:
+            result = db.session.execute(query)
+            for rows in result.partitions():
+                yield ''.join(app.json.dumps(serialize_post(row)) + '\n' for row in rows)
+            app.logger.info('Posts exported successfully')
+        except SQLAlchemyError as e:
+            # Headers are already sent, so the only option left is to log and cut the stream short
+            app.logger.error('Database error during export: %s', e)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# Route to search the current user's posts by title and body, best match first
+@bp.route('/posts/search', methods=['GET'])
+@jwt_required()  # JWT authentication required
+@rate_limit('read', cost=3) # Rate limiting per user; a ranked full-text query costs more than a lookup
+@read_replica # Served from a replica unless the user just wrote
+def search():
+    try:
+        q = request.args.get('q', '').strip()
+        if not q:
+            raise BadRequest('Query parameter q is required')
+        if len(q) > app.config['SEARCH_MAX_QUERY_LENGTH']:
+            raise BadRequest(f"Query must be at most {app.config['SEARCH_MAX_QUERY_LENGTH']} characters")
+        limit = request.args.get('limit', 10, type=int)
+        if not 1 <= limit <= app.config['SEARCH_MAX_LIMIT']:
+            raise BadRequest(f"limit must be between 1 and {app.config['SEARCH_MAX_LIMIT']}")
+        cursor = request.args.get('cursor')
+        after = decode_search_cursor(cursor) if cursor else None
+
+        # One extra row tells whether there is a next page
+        rows = search_posts(get_jwt_identity(), q, limit=limit + 1, after=after)
+        next_cursor = encode_search_cursor(rows[limit - 1]) if len(rows) > limit else None
+
+        app.logger.info('Posts searched successfully')
         return jsonify({
-            'posts': data,
-            'total': pagination.total,
-            'pages': pagination.pages,
-            'current_page': pagination.page,
-            'per_page': pagination.per_page
+            'results': [{
+                'id': row.id,
+                'title': row.title,
+                'timestamp': row.timestamp,
+                'score': row.score,
+                'highlights': {'title': render_highlight(row.title_highlight), 'body': render_highlight(row.snippet)}
+            } for row in rows[:limit]],
+            'next_cursor': next_cursor
         })
+    except BadRequest as e:
+        app.logger.error('Bad request: %s', e)
+        return jsonify({'message': str(e)}), 400
     except SQLAlchemyError as e:
         app.logger.error('Database error: %s', e)
         return jsonify({'message': 'Database error occurred', 'details': str(e)}), 500
@@ -178,17 +473,33 @@ def get_posts():
 # Route to get a specific blog post by ID
 @bp.route('/posts/<int:id>', methods=['GET'])
 @jwt_required()  # JWT authentication required
-@limiter.limit("20 per minute") # Rate limiting
+@rate_limit('read', cost=2) # Rate limiting per user; always reaches the database
+@read_replica # Served from a replica unless the user just wrote
 def get_post(id):
     try:
+        fields = parse_fields()
         user_id = get_jwt_identity()
-        post = BlogPost.query.filter_by(id=id, user_id=user_id).first()
-        if post is None:
+
+        # Revalidation only needs the row version, so check it before loading the post itself
+        if request.if_none_match:
+            updated_at = db.session.query(BlogPost.updated_at).filter_by(id=id, user_id=user_id).scalar()
+            if updated_at is not None:
+                response = not_modified(make_etag('post', id, updated_at, fields))
+                if response is not None:
+                    return response
+
+        row = get_post_row(id, user_id, fields)
+        if row is None:
             app.logger.warning('User not authorized to access this post')
             return jsonify({'message': 'User not authorized to access this post'}), 403
 
-        app.logger.info('Post retrieved successfully: %s', post.id)
-        return jsonify({'id': post.id, 'title': post.title, 'body': post.body, 'timestamp': post.timestamp})
+        app.logger.info('Post retrieved successfully: %s', id)
+        response = jsonify(serialize_row(row, fields))
+        response.set_etag(make_etag('post', id, row.updated_at, fields))
+        return response
+    except BadRequest as e:
+        app.logger.error('Bad request: %s', e)
+        return jsonify({'message': str(e)}), 400
     except SQLAlchemyError as e:
         app.logger.error('Database error: %s', e)
         return jsonify({'message': 'Database error occurred', 'details': str(e)}), 500
@@ -199,31 +510,66 @@ def get_post(id):
 # Route to update a specific blog post by ID
 @bp.route('/posts/<int:id>', methods=['PUT'])
 @jwt_required() # JWT authentication required
-@limiter.limit("5 per minute") # Rate limiting
+@rate_limit('write') # Rate limiting per user
 def update_post(id):
     try:
         data = request.get_json()
-        if not data:
+        if not data or not isinstance(data, dict):
             raise BadRequest('Invalid JSON data')
 
+        title = data.get('title')
+        body = data.get('body')
+
+        error = validate_post_fields(title, body)
+        if error:
+            app.logger.warning(error)
+            return jsonify({'message': error}), 400
+
         user_id = get_jwt_identity()
-        post = BlogPost.query.filter_by(id=id, user_id=user_id).first()
-        if post is None:
+        if not update_post_values(id, user_id, {'title': title, 'body': body}):
             app.logger.warning('User not authorized to access this post')
             return jsonify({'message': 'User not authorized to access this post'}), 403
 
-        title = data.get('title')
-        body = data.get('body')
+        app.logger.info('Post updated successfully: %s', id)
+        return jsonify({'message': 'Post updated successfully'})
+    except BadRequest as e:
+        app.logger.error('Bad request: %s', e)
+        return jsonify({'message': str(e)}), 400
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        app.logger.error('Database error: %s', e)
+        return jsonify({'message': 'Database error occurred', 'details': str(e)}), 500
+    except Exception as e:
+        app.logger.error('Unexpected error: %s', e)
+        return jsonify({'message': 'An unexpected error occurred', 'details': str(e)}), 500
+
+# Route to partially update a specific blog post by ID
+@bp.route('/posts/<int:id>', methods=['PATCH'])
+@jwt_required() # JWT authentication required
+@rate_limit('write') # Rate limiting per user
+def patch_post(id):
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data, dict):
+            raise BadRequest('Invalid JSON data')
 
-        if not title or not body:
-            app.logger.warning('Title and body are required')
-            return jsonify({'message': 'Title and body are required'}), 400
+        values = {name: data[name] for name in ('title', 'body') if name in data}
+        if not values:
+            app.logger.warning('Title or body is required')
+            return jsonify({'message': 'Title or body is required'}), 400
 
-        post.title = title
-        post.body = body
-        db.session.commit()
+        for name, value in values.items():
+            error = validate_post_field(name, value)
+            if error:
+                app.logger.warning(error)
+                return jsonify({'message': error}), 400
 
-        app.logger.info('Post updated successfully: %s', post.id)
+        user_id = get_jwt_identity()
+        if not update_post_values(id, user_id, values):
+            app.logger.warning('User not authorized to access this post')
+            return jsonify({'message': 'User not authorized to access this post'}), 403
+
+        app.logger.info('Post updated successfully: %s', id)
         return jsonify({'message': 'Post updated successfully'})
     except BadRequest as e:
         app.logger.error('Bad request: %s', e)
@@ -239,19 +585,23 @@ def update_post(id):
 # Route to delete a specific blog post by ID
 @bp.route('/posts/<int:id>', methods=['DELETE'])
 @jwt_required() # JWT authentication required
-@limiter.limit("5 per minute") # Rate limiting
+@rate_limit('write') # Rate limiting per user
 def delete_post(id):
     try:
         user_id = get_jwt_identity()
-        post = BlogPost.query.filter_by(id=id, user_id=user_id).first()
-        if post is None:
+        # A single DELETE ... RETURNING; no row back means the post is missing or not owned by the user
+        result = db.session.execute(
+            delete(BlogPost).where(BlogPost.id == id, BlogPost.user_id == user_id).returning(BlogPost.id))
+        if result.first() is None:
+            db.session.rollback()
             app.logger.warning('User not authorized to access this post')
             return jsonify({'message': 'User not authorized to access this post'}), 403
 
-        db.session.delete(post)
+        User.adjust_post_count(user_id, -1)
         db.session.commit()
+        bump_user_version('posts', user_id)
 
-        app.logger.info('Post deleted successfully: %s', post.id)
+        app.logger.info('Post deleted successfully: %s', id)
         return jsonify({'message': 'Post deleted successfully'})
     except SQLAlchemyError as e:
         db.session.rollback()
@@ -260,3 +610,27 @@ def delete_post(id):
     except Exception as e:
         app.logger.error('Unexpected error: %s', e)
         return jsonify({'message': 'An unexpected error occurred', 'details': str(e)}), 500
+
+# Route to list the request profiles written by the profiler, for holders of a profiling token
+@bp.route('/admin/profiles', methods=['GET'])
+def list_profiles():
+    if not profiler.authorized():
+        app.logger.warning('Profile listing without a valid profiling token')
+        return jsonify({'message': 'A valid profiling token is required'}), 403
+    try:
+        profiles = profiler.list_profiles(request.args.get('endpoint'))
+    except OSError as e:
+        app.logger.error('Could not list profiles: %s', e)
+        return jsonify({'message': 'Could not list profiles', 'details': str(e)}), 500
+    return jsonify({'profiles': profiles, 'directory': app.config['PROFILE_DIR']})
+
+# Route to get hit/miss counters of the per-user response cache
+@bp.route('/cache/stats', methods=['GET'])
+@jwt_required()  # JWT authentication required
+def get_cache_stats():
+    return jsonify(cache_stats.snapshot())
+
+# Route to expose request, SQL, cache and rate limit metrics of all workers in Prometheus text format
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
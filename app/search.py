@@ -0,0 +1,76 @@
+import html
+import re
+from sqlalchemy import select, func, literal_column, table, column, tuple_
+from app import db
+from app.models import BlogPost
+
+# Markers wrapped around matched terms in highlighted titles and body snippets
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_END = '</mark>'
+
+# Control characters the database wraps matches in; the text is HTML-escaped before they
+# become HIGHLIGHT_START/END, so post content can never inject markup of its own
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+# Search terms are runs of letters and digits; everything else separates them
+TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+# The FTS5 table kept in sync with blog_post by the triggers in app/models.py
+blog_post_fts = table('blog_post_fts', column('rowid'), column('blog_post_fts'))
+
+# Function to split a query into search terms
+def parse_terms(q):
+    return TERM_PATTERN.findall(q or '')
+
+# Every term must match (stemmed), ranked by BM25 with title matches weighing double.
+# Terms are quoted so user input can never be read as FTS5 query syntax.
+def _sqlite_query(user_id, terms):
+    match = ' '.join('"' + term + '"' for term in terms)
+    fts = literal_column('blog_post_fts')
+    return (select(
+                BlogPost.id, BlogPost.title, BlogPost.timestamp,
+                func.bm25(fts, 2.0, 1.0).label('score'),
+                func.highlight(fts, 0, MATCH_START, MATCH_END).label('title_highlight'),
+                func.snippet(fts, 1, MATCH_START, MATCH_END, '…', 24).label('snippet'))
+            .select_from(blog_post_fts.join(BlogPost.__table__, BlogPost.id == blog_post_fts.c.rowid))
+            .where(blog_post_fts.c.blog_post_fts.match(match), BlogPost.user_id == user_id))
+
+# Same semantics on PostgreSQL: every term must match the weighted search_vector (title
+# weight A, body weight B), ranked by cover density. Lower scores rank first on both
+# backends, so the PostgreSQL rank is negated.
+def _postgresql_query(user_id, terms):
+    query = func.plainto_tsquery('english', ' '.join(terms))
+    vector = literal_column('blog_post.search_vector')
+    options = f'StartSel={MATCH_START}, StopSel={MATCH_END}'
+    return (select(
+                BlogPost.id, BlogPost.title, BlogPost.timestamp,
+                (-func.ts_rank_cd(vector, query)).label('score'),
+                func.ts_headline('english', BlogPost.title, query, options + ', HighlightAll=true').label('title_highlight'),
+                func.ts_headline('english', BlogPost.body, query, options + ', MaxFragments=2, MaxWords=24, MinWords=8').label('snippet'))
+            .where(vector.op('@@')(query), BlogPost.user_id == user_id))
+
+# Function to turn a highlighted title or snippet from the database into safe HTML
+def render_highlight(text):
+    if text is None:
+        return None
+    return html.escape(text, quote=False).replace(MATCH_START, HIGHLIGHT_START).replace(MATCH_END, HIGHLIGHT_END)
+
+SEARCH_QUERIES = {'sqlite': _sqlite_query, 'postgresql': _postgresql_query}
+
+# Function to search a user's posts, best match first. Pages are keyset-paginated on
+# (score, id): pass the (score, id) of the last result of the previous page as `after`.
+# Returns up to `limit` rows with id, title, timestamp, score, title_highlight and snippet.
+def search_posts(user_id, q, limit=10, after=None):
+    terms = parse_terms(q)
+    if not terms:
+        return []
+    dialect = db.session.get_bind().dialect.name
+    if dialect not in SEARCH_QUERIES:
+        raise NotImplementedError(f'Full-text search is not available on {dialect}')
+
+    ranked = SEARCH_QUERIES[dialect](user_id, terms).subquery()
+    query = select(ranked).order_by(ranked.c.score, ranked.c.id).limit(limit)
+    if after is not None:
+        query = query.where(tuple_(ranked.c.score, ranked.c.id) > tuple_(*after))
+    return db.session.execute(query).all()
@@ -0,0 +1,49 @@
+from sqlalchemy.exc import SQLAlchemyError
+from app import db, cache, hasher
+from app.log import request_logging
+from app.metrics import metrics
+
+# Lifecycle of a pre-forked worker process, called from the hooks in gunicorn.conf.py.
+# The app is created once in the master and inherited copy-on-write by every worker;
+# state that must not be shared across processes (sockets, threads, pools) is either
+# reset here or rebuilt lazily by its owner after a fork.
+
+# Forget database connections inherited from the master without closing them, since
+# they belong to the master's sockets; the worker opens its own
+def after_fork(app):
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+# Open SERVER_WARM_CONNECTIONS pooled connections per engine, the shared cache and the
+# password hashing pool, so the first requests a worker serves do not pay for them.
+# An unreachable database is logged rather than fatal: pre-ping reconnects later.
+def warm_up(app):
+    with app.app_context():
+        for name, engine in db.engines.items():
+            connections = []
+            try:
+                for _ in range(app.config['SERVER_WARM_CONNECTIONS']):
+                    connection = engine.connect()
+                    connections.append(connection)
+                    connection.exec_driver_sql('SELECT 1')
+            except SQLAlchemyError as e:
+                app.logger.warning('Could not warm up database connections of %s: %s', name or 'primary', e)
+            finally:
+                for connection in connections:
+                    connection.close()
+        cache.get('server:warm-up')
+        hasher.start()
+
+# Graceful worker exit: write the last metrics, stop the hashing pool, close the
+# database connections and flush queued log records
+def shutdown(app):
+    with app.app_context():
+        try:
+            metrics.flush()
+        except OSError as e:
+            app.logger.warning('Could not write metrics: %s', e)
+        hasher.shutdown()
+        for engine in db.engines.values():
+            engine.dispose()
+    request_logging.stop()
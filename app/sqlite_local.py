@@ -0,0 +1,39 @@
+import os
+import sqlite3
+import threading
+
+# Per-thread connections to a SQLite database file shared by the worker processes of
+# a host. Connections are opened lazily and reopened after a fork, because SQLite
+# handles must not be carried across fork(). WAL mode lets readers run alongside
+# the single writer; synchronous=NORMAL skips the fsync on every commit.
+class LocalConnection:
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.timeout = float(timeout)
+        self._local = threading.local()
+
+    def get(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            local.connection = connection
+            local.pid = os.getpid()
+        return local.connection
+
+# Create a database file (and a missing directory) private to this user, and refuse
+# files or journals owned by anyone else, e.g. planted beforehand in a shared directory
+# such as /tmp: whoever can write them can forge what every worker reads from them.
+def check_private(path):
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(directory):
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+    for name in (path, path + '-wal', path + '-shm', path + '-journal'):
+        try:
+            owner = os.stat(name).st_uid
+        except FileNotFoundError:
+            continue
+        if owner != os.geteuid():
+            raise PermissionError(f'Refusing database {name}: owned by uid {owner}, not {os.geteuid()}')
@@ -1,8 +1,36 @@
 import unittest
-from app import create_app, db
+from app import create_app, db, cache, hasher
+from app import caching
+from app.cache_backends import SQLiteCache
+from app.caching import fetch, memoize
+from app.hashing import HasherBusy
+from app.json_provider import Fragment
+from app.log import request_logging
+from app.metrics import metrics
+from app.group_commit import group_committer
+from app.profiling import profiler, merge_collapsed
+from app.server import after_fork, warm_up, shutdown
+from app.limiter_storage import SQLiteStorage
 from app.models import User, BlogPost
-from flask_jwt_extended import create_access_token
+from flask_jwt_extended import create_access_token, decode_token
+from limits import parse
+from limits.strategies import FixedWindowRateLimiter, MovingWindowRateLimiter
+from sqlalchemy import event, insert, text
+from sqlalchemy.exc import IntegrityError, OperationalError
 from config import TestConfig
+from datetime import datetime, timedelta, timezone
+from flask.json.provider import DefaultJSONProvider
+import gzip
+import io
+import json
+import logging
+import re
+from unittest.mock import patch
+import os
+import pstats
+import tempfile
+import threading
+import time
 
 class APITestCase(unittest.TestCase):
     # Set up the application with the test configuration
@@ -71,6 +99,14 @@ class APITestCase(unittest.TestCase):
         self.assertEqual(len(data['posts']), 1)
         self.assertEqual(data['posts'][0]['title'], 'Test Title')
 
+    def test_get_posts_of_deleted_user(self):
+        print("Starting get posts of deleted user test")
+        # A still valid token of a user whose row is gone
+        headers = {'Authorization': f'Bearer {create_access_token(identity=9999)}'}
+        response = self.client.get('/posts', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['posts'], [])
+
     def test_get_post_by_id(self):
         print("Starting get post by id test")
         post_response = self.client.post('/posts', json={'title': 'Test Title', 'body': 'Test Body'}, headers={'Authorization': f'Bearer {self.access_token}'})
@@ -83,6 +119,288 @@ class APITestCase(unittest.TestCase):
         self.assertEqual(data['title'], 'Test Title')
         self.assertEqual(data['body'], 'Test Body')
 
+    def test_get_posts_cache_is_per_user(self):
+        print("Starting get posts cache is per user test")
+        post_response = self.client.post('/posts', json={'title': 'Test Title', 'body': 'Test Body'}, headers={'Authorization': f'Bearer {self.access_token}'})
+        self.assertEqual(post_response.status_code, 201)
+        response = self.client.get('/posts', headers={'Authorization': f'Bearer {self.access_token}'})
+        self.assertEqual(len(response.get_json()['posts']), 1)
+
+        # Same URL for another user must not be served from the first user's cache entry
+        response = self.client.get('/posts', headers={'Authorization': f'Bearer {self.other_access_token}'})
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        self.assertEqual(len(response.get_json()['posts']), 0)
+
+    def test_get_posts_cache_invalidated_on_write(self):
+        print("Starting get posts cache invalidated on write test")
+        headers = {'Authorization': f'Bearer {self.access_token}'}
+        before = self.client.get('/cache/stats', headers=headers).get_json()
+
+        response = self.client.get('/posts', headers=headers)
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        response = self.client.get('/posts', headers=headers)
+        self.assertEqual(response.headers['X-Cache'], 'HIT')
+
+        post_response = self.client.post('/posts', json={'title': 'Test Title', 'body': 'Test Body'}, headers=headers)
+        self.assertEqual(post_response.status_code, 201)
+        response = self.client.get('/posts', headers=headers)
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        self.assertEqual(len(response.get_json()['posts']), 1)
+
+        after = self.client.get('/cache/stats', headers=headers).get_json()
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['misses'] - before['misses'], 2)
+
+    def test_get_posts_cursor_pagination(self):
+        print("Starting get posts cursor pagination test")
+        # Insert directly to stay clear of the create rate limit; two posts share a timestamp
+        base = datetime(2024, 1, 1)
+        for i, offset in enumerate([0, 1, 2, 2, 3]):
+            db.session.add(BlogPost(title=f'Post {i}', body='Body', user_id=self.user.id, timestamp=base + timedelta(minutes=offset)))
+        db.session.commit()
+        expected = [post.id for post in BlogPost.query.order_by(BlogPost.timestamp.desc(), BlogPost.id.desc())]
+
+        seen = []
+        cursor = ''
+        while cursor is not None:
+            response = self.client.get('/posts', query_string={'cursor': cursor, 'per_page': 2}, headers={'Authorization': f'Bearer {self.access_token}'})
+            self.assertEqual(response.status_code, 200)
+            data = response.get_json()
+            self.assertNotIn('total', data)
+            seen.extend(post['id'] for post in data['posts'])
+            cursor = data['next_cursor']
+        self.assertEqual(seen, expected)
+
+    def test_get_posts_invalid_cursor(self):
+        print("Starting get posts invalid cursor test")
+        response = self.client.get('/posts?cursor=not-a-cursor', headers={'Authorization': f'Bearer {self.access_token}'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_post_count_maintained_on_create_and_delete(self):
+        print("Starting post count maintained on create and delete test")
+        headers = {'Authorization': f'Bearer {self.access_token}'}
+        post_response = self.client.post('/posts', json={'title': 'Test Title', 'body': 'Test Body'}, headers=headers)
+        self.assertEqual(post_response.status_code, 201)
+        self.client.post('/posts', json={'title': 'Second Title', 'body': 'Second Body'}, headers=headers)
+        self.assertEqual(db.session.get(User, self.user.id).post_count, 2)
+
+        self.client.delete(f"/posts/{post_response.get_json()['id']}", headers=headers)
+        db.session.expire_all()
+        self.assertEqual(db.session.get(User, self.user.id).post_count, 1)
+
+        response = self.client.get('/posts?per_page=1', headers=headers)
+        data = response.get_json()
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(data['pages'], 1)
+
+    def test_reconcile_post_counts(self):
+        print("Starting reconcile post counts test")
+        db.session.add(BlogPost(title='Test Title', body='Test Body', user_id=self.user.id))
+        self.user.post_count = 5
+        db.session.commit()
+
+        # Listing totals are read from the counter, so a drifted counter shows up here
+        response = self.client.get('/posts', headers={'Authorization': f'Bearer {self.access_token}'})
+        self.assertEqual(response.get_json()['total'], 5)
+
+        self.assertEqual(User.reconcile_post_counts(), 1)
+        self.assertEqual(db.session.get(User, self.user.id).post_count, 1)
+        self.assertEqual(db.session.get(User, self.other_user.id).post_count, 0)
+
+    def test_json_body_must_be_an_object(self):
+        print("Starting JSON body must be an object test")
+        headers = {'Authorization': f'Bearer {self.access_token}'}
+        self.client.post('/posts', json={'title': 'Test Title', 'body': 'Test Body'}, headers=headers)
+        response = self.client.patch('/posts/1', json=['title'], headers=headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.put('/posts/1', json=['title'], headers=headers).status_code, 400)
+        self.assertEqual(self.client.post('/posts', json=['title'], headers=headers).status_code, 400)
+        self.assertEqual(self.client.post('/login', json=['email']).status_code, 400)
+
+    def test_create_posts_batch(self):
+        print("Starting create posts batch test")
+        headers = {'Authorization': f'Bearer {self.access_token}'}
+        posts = [{'title': f'Title {i}', 'body': f'Body {i}'} for i in range(7)]
+        response = self.client.post('/posts/batch', json=posts, headers=headers)
+        self.assertEqual(response.status_code, 201)
+        ids = response.get_json()['ids']
+        self.assertEqual(len(ids), 7)
+        self.assertEqual([db.session.get(BlogPost, post_id).title for post_id in ids], [post['title'] for post in posts])
+        self.assertEqual(db.session.get(User, self.user.id).post_count, 7)
+
+    def test_create_posts_batch_validates_all_items(self):
+        print("Starting create posts batch validates all items test")
+        posts = [{'title': 'Good', 'body': 'Body'}, {'title': '', 'body': 'Body'}, 'not a post']
+        response = self.client.post('/posts/batch', json=posts, headers={'Authorization': f'Bearer {self.access_token}'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.get_json()['errors']], [1, 2])
+        self.assertEqual(BlogPost.query.count(), 0)
+
+    def test_create_posts_batch_rate_limit_charged_per_post(self):
+        print("Starting create posts batch rate limit charged per post test")
+        self.app.config['RATELIMIT_TIERS'] = {'standard': {'read': '10 per minute', 'write': '10 per minute', 'bulk': '1 per minute'}}
+        headers = {'Authorization': f'Bearer {self.access_token}'}
+        posts = [{'title': f'Title {i}', 'body': 'Body'} for i in range(6)]
+        response = self.client.post('/posts/batch', json=posts, headers=headers)
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post('/posts/batch', json=posts, headers=headers)
+        self.assertEqual(response.status_code, 429)
+
+    def test_create_posts_batch_of_max_size_as_standard_user(self):
+        print("Starting create posts batch of max size as standard user test")
+        headers = {'Authorization': f'Bearer {self.access_token}'}
+        posts = [{'title': f'Title {i}', 'body': 'Body'} for i in range(self.app.config['POSTS_BATCH_MAX_SIZE'])]
+        response = self.client.post('/posts/batch', json=posts, headers=headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.get_json()['ids']), len(posts))
+
+    def test_create_posts_batch_larger_than_write_budget(self):
+        print("Starting create posts batch larger than write budget test")
+        self.app.config['RATELIMIT_TIERS'] = {'standard': {'read': '10 per minute', 'write': '10 per minute', 'bulk': '1 per minute'}}
+        headers = {'Authorization': f'Bearer {self.access_token}'}
+        posts = [{'title': f'Title {i}', 'body': 'Body'} for i in range(11)]
+        response = self.client.post('/posts/batch', json=posts, headers=headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['message'], 'A batch may contain at most 10 posts')
+
+    def test_export_posts(self):
+        print("Starting export posts test")
+        base = datetime(2024, 1, 1)
+        for i in range(5):
+            db.session.add(BlogPost(title=f'Post {i}', body='Body', user_id=self.user.id, timestamp=base + timedelta(minutes=i)))
+        db.session.add(BlogPost(title='Other', body='Body', user_id=self.other_user.id))
+        db.session.commit()
+        self.app.config['EXPORT_CHUNK_SIZE'] = 2
+
+        response = self.client.get('/posts/export', headers={'Authorization': f'Bearer {self.access_token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([post['title'] for post in lines], [f'Post {i}' for i in reversed(range(5))])
+
+    def test_import_posts(self):
+        print("Starting import posts test")
+        lines = [
+            json.dumps({'title': 'First', 'body': 'Body', 'timestamp': 'Mon, 01 Jan 2024 00:00:00 GMT'}),
+            'not json',
+            json.dumps({'title': '', 'body': 'Body'}),
+            '',
+            json.dumps({'title': 'Second', 'body': 'Body', 'timestamp': '2024-01-02T00:00:00'}),
+            json.dumps({'title': 'Third', 'body': 'Body'}),
+        ]
+        response = self.client.post('/posts/import?chunk_size=2', data='\n'.join(lines), content_type='application/x-ndjson', headers={'Authorization': f'Bearer {self.access_token}'})
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['imported'], 3)
+        self.assertEqual([error['line'] for error in data['errors']], [2, 3])
+        self.assertEqual(db.session.get(User, self.user.id).post_count, 3)
+        self.assertEqual(BlogPost.query.filter_by(title='First').one().timestamp, datetime(2024, 1, 1))
+
+    def test_get_posts_sparse_fields(self):
+        print("Starting get posts sparse fields test")
+        headers = {'Authorization': f'Bearer {self.access_token}'}
+        post_response = self.client.post('/posts', json={'title': 'Test Title', 'body': 'Test Body'}, headers=headers)
+        post_id = post_response.get_json()['id']
+
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            response = self.client.get('/posts?fields=id,title', headers=headers)
+            cursor_response = self.client.get('/posts?cursor=&fields=title', headers=headers)
+            post = self.client.get(f'/posts/{post_id}?fields=title', headers=headers).get_json()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+
+        self.assertEqual(response.get_json()['posts'], [{'id': post_id, 'title': 'Test Title'}])
+        self.assertEqual(cursor_response.get_json()['posts'], [{'title': 'Test Title'}])
+        self.assertEqual(post, {'title': 'Test Title'})
+        # The body column is never selected
+        self.assertTrue(statements)
+        self.assertFalse([statement for statement in statements if 'blog_post.body' in statement])
+
+        response = self.client.get('/posts?fields=id,password', headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_get_post_conditional(self):
+        print("Starting get post conditional test")
+        headers = {'Authorization': f'Bearer {self.access_token}'}
+        post_response = self.client.post('/posts', json={'title': 'Test Title', 'body': 'Test Body'}, headers=headers)
+        post_id = post_response.get_json()['id']
+
+        response = self.client.get(f'/posts/{post_id}', headers=headers)
+        etag = response.headers['ETag']
+        response = self.client.get(f'/posts/{post_id}', headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+        # A different representation of the same row has its own ETag
+        response = self.client.get(f'/posts/{post_id}?fields=title', headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+        self.client.patch(f'/posts/{post_id}', json={'title': 'Patched Title'}, headers=headers)
+        response = self.client.get(f'/posts/{post_id}', headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_get_posts_conditional(self):
+        print("Starting get posts conditional test")
+        headers = {'Authorization': f'Bearer {self.access_token}'}
+        self.client.post('/posts', json={'title': 'Test Title', 'body': 'Test Body'}, headers=headers)
+        etag = self.client.get('/posts', headers=headers).headers['ETag']
+
+        # Served from the cached entry
+        response = self.client.get('/posts', headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['X-Cache'], 'HIT')
+
+        # Recomputed from the row versions after the cache is dropped
+        cache.clear()
+        response = self.client.get('/posts', headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+
+        self.client.post('/posts', json={'title': 'Second Title', 'body': 'Second Body'}, headers=headers)
+        response = self.client.get('/posts', headers={**headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()['posts']), 2)
+
+    def test_response_compression(self):
+        print("Starting response compression test")
+        headers = {'Authorization': f'Bearer {self.access_token}'}
+        for i in range(5):
+            db.session.add(BlogPost(title=f'Post {i}', body='Body ' * 100, user_id=self.user.id))
+        db.session.commit()
+
+        plain = self.client.get('/posts', headers=headers)
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertIn('Accept-Encoding', plain.headers['Vary'])
+
+        response = self.client.get('/posts', headers={**headers, 'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+        self.assertTrue(response.headers['ETag'].startswith('W/'))
+
+        # The weakened ETag still revalidates
+        response = self.client.get('/posts', headers={**headers, 'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+        # Small bodies are sent as is
+        response = self.client.get('/cache/stats', headers={**headers, 'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_streaming_response_compression(self):
+        print("Starting streaming response compression test")
+        for i in range(5):
+            db.session.add(BlogPost(title=f'Post {i}', body='Body', user_id=self.user.id))
+        db.session.commit()
+        self.app.config['EXPORT_CHUNK_SIZE'] = 2
+
+        response = self.client.get('/posts/export', headers={'Authorization': f'Bearer {self.access_token}', 'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        lines = gzip.decompress(response.data).decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 5)
+
     def test_update_post(self):
         print("Starting update post test")
         post_response = self.client.post('/posts', json={'title': 'Test Title', 'body': 'Test Body'}, headers={'Authorization': f'Bearer {self.access_token}'})
@@ -94,6 +412,23 @@ class APITestCase(unittest.TestCase):
         data = response.get_json()
         self.assertEqual(data['message'], 'Post updated successfully')
 
+    def test_patch_post(self):
+        print("Starting patch post test")
+        headers = {'Authorization': f'Bearer {self.access_token}'}
+        post_response = self.client.post('/posts', json={'title': 'Test Title', 'body': 'Test Body'}, headers=headers)
+        post_id = post_response.get_json()['id']
+
+        response = self.client.patch(f'/posts/{post_id}', json={'title': 'Patched Title'}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        data = self.client.get(f'/posts/{post_id}', headers=headers).get_json()
+        self.assertEqual(data['title'], 'Patched Title')
+        self.assertEqual(data['body'], 'Test Body')
+
+        response = self.client.patch(f'/posts/{post_id}', json={'body': ''}, headers=headers)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(f'/posts/{post_id}', json={'title': 'Stolen'}, headers={'Authorization': f'Bearer {self.other_access_token}'})
+        self.assertEqual(response.status_code, 403)
+
     def test_delete_post(self):
         print("Starting delete post test")
         post_response = self.client.post('/posts', json={'title': 'Test Title', 'body': 'Test Body'}, headers={'Authorization': f'Bearer {self.access_token}'})
@@ -126,6 +461,455 @@ class APITestCase(unittest.TestCase):
         print(f"Other user delete post response: {response.data}")
         self.assertEqual(response.status_code, 403)
 
+    def test_login_rehashes_outdated_password_hash(self):
+        print("Starting login rehashes outdated password hash test")
+        self.app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+        response = self.client.post('/login', json={'email': 'testuser@example.com', 'password': 'testpass'})
+        self.assertEqual(response.status_code, 200)
+        user = db.session.get(User, self.user.id)
+        self.assertTrue(user.password_hash.startswith('pbkdf2:sha256:2000$'))
+        self.assertTrue(user.check_password('testpass'))
+
+    def test_login_returns_503_when_hashing_saturated(self):
+        print("Starting login returns 503 when hashing saturated test")
+        with patch.object(hasher, 'verify', side_effect=HasherBusy('Password hashing queue is full')):
+            response = self.client.post('/login', json={'email': 'testuser@example.com', 'password': 'testpass'})
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+
+    def test_password_hashing_in_worker_pool(self):
+        print("Starting password hashing in worker pool test")
+        self.app.config['PASSWORD_HASH_WORKERS'] = 1
+        try:
+            password_hash = hasher.hash('secret123')
+            self.assertTrue(hasher.verify(password_hash, 'secret123'))
+            self.assertFalse(hasher.verify(password_hash, 'wrong'))
+        finally:
+            hasher.shutdown()
+
+    def test_password_hashing_timed_out_job_keeps_its_slot(self):
+        print("Starting password hashing timed out job keeps its slot test")
+        self.app.config.update(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE_SIZE=0, PASSWORD_HASH_TIMEOUT=0.2,
+                               PASSWORD_HASH_METHOD='pbkdf2:sha256:3000000')
+        try:
+            with self.assertRaisesRegex(HasherBusy, 'timed out'):
+                hasher.hash('secret123')
+            # The abandoned job still runs in the pool, so there is no room for another one
+            with self.assertRaisesRegex(HasherBusy, 'queue is full'):
+                hasher.hash('secret123')
+        finally:
+            hasher.shutdown()
+
+    def test_rate_limit_keyed_by_user(self):
+        print("Starting rate limit keyed by user test")
+        self.app.config['RATELIMIT_TIERS'] = {'standard': {'read': '10 per minute', 'write': '2 per minute', 'bulk': '1 per minute'}}
+        headers = {'Authorization': f'Bearer {self.access_token}'}
+        for i in range(2):
+            response = self.client.post('/posts', json={'title': 'Test Title', 'body': 'Test Body'}, headers=headers)
+            self.assertEqual(response.status_code, 201)
+
+        # The write bucket is shared between write routes
+        response = self.client.patch('/posts/1', json={'title': 'Patched'}, headers=headers)
+        self.assertEqual(response.status_code, 429)
+
+        # Another user from the same address has their own budget
+        response = self.client.post('/posts', json={'title': 'Test Title', 'body': 'Test Body'}, headers={'Authorization': f'Bearer {self.other_access_token}'})
+        self.assertEqual(response.status_code, 201)
+
+    def test_rate_limit_by_tier(self):
+        print("Starting rate limit by tier test")
+        self.app.config['RATELIMIT_TIERS'] = {
+            'standard': {'read': '2 per minute', 'write': '1 per minute', 'bulk': '1 per minute'},
+            'premium': {'read': '6 per minute', 'write': '1 per minute', 'bulk': '1 per minute'},
+        }
+        premium_token = create_access_token(identity=self.other_user.id, additional_claims={'tier': 'premium'})
+
+        # GET /posts/<id> costs two read units
+        statuses = [self.client.get('/posts/1', headers={'Authorization': f'Bearer {self.access_token}'}).status_code for _ in range(2)]
+        self.assertEqual(statuses, [403, 429])
+        statuses = [self.client.get('/posts/1', headers={'Authorization': f'Bearer {premium_token}'}).status_code for _ in range(4)]
+        self.assertEqual(statuses, [403, 403, 403, 429])
+
+    def test_login_token_carries_tier(self):
+        print("Starting login token carries tier test")
+        self.user.tier = 'premium'
+        db.session.commit()
+        response = self.client.post('/login', json={'email': 'testuser@example.com', 'password': 'testpass'})
+        self.assertEqual(decode_token(response.get_json()['access_token'])['tier'], 'premium')
+
+    def test_structured_request_logging(self):
+        print("Starting structured request logging test")
+        stream = io.StringIO()
+        handler = request_logging.attach(self.app, logging.StreamHandler(stream))
+        self.app.logger.setLevel(logging.INFO)
+        headers = {'Authorization': f'Bearer {self.access_token}', 'X-Request-ID': 'req-123'}
+        try:
+            response = self.client.post('/posts', json={'title': 'Test Title', 'body': 'Test Body'}, headers=headers)
+            self.assertEqual(response.headers['X-Request-ID'], 'req-123')
+            response = self.client.get('/posts', headers={'X-Request-ID': 'bad id!'})
+            self.assertRegex(response.headers['X-Request-ID'], r'^[0-9a-f]{32}$')
+        finally:
+            request_logging.stop()  # Flushes the queue
+            self.app.logger.removeHandler(handler)
+
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        created = next(record for record in records if record['message'] == 'Post created successfully')
+        self.assertEqual(created['request_id'], 'req-123')
+        self.assertEqual(created['user_id'], self.user.id)
+        self.assertEqual(created['route'], '/posts')
+        self.assertEqual(created['method'], 'POST')
+        completed = [record for record in records if record['message'] == 'Request completed']
+        self.assertEqual([record['status'] for record in completed], [201, 401])
+        self.assertGreaterEqual(completed[0]['latency_ms'], 0)
+
+    def test_logged_exception_has_its_own_field(self):
+        print("Starting logged exception has its own field test")
+        stream = io.StringIO()
+        handler = request_logging.attach(self.app, logging.StreamHandler(stream))
+        try:
+            try:
+                raise ValueError('broken')
+            except ValueError:
+                self.app.logger.exception('Import failed for %s', 'user 1')
+        finally:
+            request_logging.stop()
+            self.app.logger.removeHandler(handler)
+
+        record = json.loads(stream.getvalue().splitlines()[-1])
+        self.assertEqual(record['message'], 'Import failed for user 1')
+        self.assertIn('Traceback', record['exception'])
+        self.assertIn('ValueError: broken', record['exception'])
+
+    def test_retrieval_log_lines_are_sampled(self):
+        print("Starting retrieval log sampling test")
+        self.app.config['LOG_SAMPLE_RATE'] = 0.0
+        stream = io.StringIO()
+        handler = request_logging.attach(self.app, logging.StreamHandler(stream))
+        self.app.logger.setLevel(logging.INFO)
+        try:
+            for _ in range(3):
+                response = self.client.get('/posts?per_page=5', headers={'Authorization': f'Bearer {self.access_token}'})
+                self.assertEqual(response.status_code, 200)
+        finally:
+            request_logging.stop()
+            self.app.logger.removeHandler(handler)
+
+        messages = [json.loads(line)['message'] for line in stream.getvalue().splitlines()]
+        self.assertNotIn('Posts retrieved successfully', messages)
+        self.assertEqual(messages.count('Request completed'), 3)
+
+    def test_metrics_endpoint(self):
+        print("Starting metrics endpoint test")
+        metrics.reset()
+        self.app.config['RATELIMIT_AUTH_LIMIT'] = '1 per minute'
+        headers = {'Authorization': f'Bearer {self.access_token}'}
+        self.client.get('/posts', headers=headers)
+        self.client.get('/posts', headers=headers)
+        self.client.post('/login', json={'email': 'testuser@example.com', 'password': 'testpass'})
+        self.client.post('/login', json={'email': 'testuser@example.com', 'password': 'testpass'})
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        text = response.get_data(as_text=True)
+        self.assertIn('http_requests_total{route="/posts",method="GET",status="200"} 2', text)
+        self.assertIn('http_request_duration_seconds_count{route="/posts",method="GET"} 2', text)
+        self.assertIn('http_request_duration_seconds_bucket{route="/posts",method="GET",le="+Inf"} 2', text)
+        self.assertIn('cache_requests_total{namespace="posts",result="hit"} 1', text)
+        self.assertIn('cache_requests_total{namespace="posts",result="miss"} 1', text)
+        self.assertIn('ratelimit_rejections_total{route="/login"} 1', text)
+        queries = re.search(r'^db_queries_total\{route="/posts"\} (\d+)$', text, re.MULTILINE)
+        self.assertGreater(int(queries.group(1)), 0)
+
+    def test_metrics_failed_statements_do_not_leak(self):
+        print("Starting metrics failed statements do not leak test")
+        connection = db.session.connection()
+        for _ in range(3):
+            with self.assertRaises(OperationalError):
+                connection.execute(text('SELECT * FROM missing_table'))
+        self.assertEqual(connection.info.get('metrics_query_start'), [])
+        db.session.rollback()
+
+    def test_metrics_dir_must_be_private(self):
+        print("Starting metrics dir must be private test")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            shared = os.path.join(tmpdir, 'shared')
+            os.mkdir(shared)
+            os.chmod(shared, 0o777)
+            self.app.config['METRICS_DIR'] = shared
+            with self.app.app_context(), self.assertRaises(PermissionError):
+                metrics.flush()
+
+            # A planted symlink is not followed
+            private = os.path.join(tmpdir, 'private')
+            victim = os.path.join(tmpdir, 'victim')
+            with open(victim, 'w') as f:
+                f.write('keep')
+            os.mkdir(private, 0o700)
+            os.symlink(victim, os.path.join(private, '.lock'))
+            self.app.config['METRICS_DIR'] = private
+            with self.app.app_context(), self.assertRaises(OSError):
+                metrics.render()
+            with open(victim) as f:
+                self.assertEqual(f.read(), 'keep')
+            with patch('app.private_files.os.geteuid', return_value=os.geteuid() + 1):
+                with self.app.app_context(), self.assertRaises(PermissionError):
+                    metrics.flush()
+
+    def test_metrics_aggregated_across_workers(self):
+        print("Starting metrics aggregated across workers test")
+        metrics.reset()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.app.config['METRICS_DIR'] = tmpdir
+            # A worker that has exited left its numbers behind
+            dead_pid = 2 ** 22 + 1
+            with open(os.path.join(tmpdir, f'metrics-{dead_pid}.json'), 'w') as f:
+                json.dump({'counters': [['http_requests_total', [['route', '/posts'], ['method', 'GET'], ['status', '200']], 5]],
+                           'histograms': []}, f)
+            self.client.get('/posts', headers={'Authorization': f'Bearer {self.access_token}'})
+
+            text = self.client.get('/metrics').get_data(as_text=True)
+            self.assertIn('http_requests_total{route="/posts",method="GET",status="200"} 6', text)
+            self.assertFalse(os.path.exists(os.path.join(tmpdir, f'metrics-{dead_pid}.json')))
+            self.assertTrue(os.path.exists(os.path.join(tmpdir, 'archive.json')))
+            self.assertTrue(os.path.exists(os.path.join(tmpdir, f'metrics-{os.getpid()}.json')))
+
+            # Archived counts are still reported on the next scrape
+            text = self.client.get('/metrics').get_data(as_text=True)
+            self.assertIn('http_requests_total{route="/posts",method="GET",status="200"} 6', text)
+
+    def test_profiling_with_signed_header(self):
+        print("Starting profiling with signed header test")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.app.config.update(PROFILE_DIR=tmpdir, PROFILE_MODE='cprofile')
+            token = profiler.make_token()
+            headers = {'Authorization': f'Bearer {self.access_token}'}
+
+            response = self.client.get('/posts', headers=headers)
+            self.assertNotIn('X-Profile-File', response.headers)
+            response = self.client.get('/posts', headers={**headers, 'X-Profile-Token': 'forged'})
+            self.assertNotIn('X-Profile-File', response.headers)
+
+            response = self.client.get('/posts', headers={**headers, 'X-Profile-Token': token})
+            self.assertEqual(response.status_code, 200)
+            profile_file = response.headers['X-Profile-File']
+            self.assertTrue(profile_file.startswith('routes.get_posts'))
+            self.assertGreater(pstats.Stats(os.path.join(tmpdir, profile_file)).total_calls, 0)
+
+            self.assertEqual(self.client.get('/admin/profiles').status_code, 403)
+            response = self.client.get('/admin/profiles', headers={'X-Profile-Token': token})
+            self.assertEqual(response.status_code, 200)
+            profiles = [profile for profile in response.get_json()['profiles'] if profile['file'] == profile_file]
+            self.assertEqual(profiles[0]['format'], 'pstats')
+
+    def test_sampled_profiling_and_merge(self):
+        print("Starting sampled profiling and merge test")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.app.config.update(PROFILE_DIR=tmpdir, PROFILE_ENABLED=True, PROFILE_SAMPLE_RATE=1.0,
+                                   PROFILE_MODE='sampler', PROFILE_SAMPLER_INTERVAL=0.001)
+            response = self.client.get('/posts', headers={'Authorization': f'Bearer {self.access_token}'})
+            # Sampled requests are profiled, but only token holders learn where the dump went
+            self.assertNotIn('X-Profile-File', response.headers)
+            dumps = os.listdir(os.path.join(tmpdir, 'routes.get_posts'))
+            self.assertEqual(len(dumps), 1)
+            self.assertTrue(dumps[0].endswith('.collapsed'))
+
+            first, second, merged = (os.path.join(tmpdir, name) for name in ('a.collapsed', 'b.collapsed', 'merged'))
+            with open(first, 'w') as f:
+                f.write('main (run.py:1);get_posts (routes.py:9) 3\nmain (run.py:1) 1\n')
+            with open(second, 'w') as f:
+                f.write('main (run.py:1);get_posts (routes.py:9) 2\n')
+            merge_collapsed([first, second], merged)
+            with open(merged) as f:
+                self.assertEqual(f.read(), 'main (run.py:1);get_posts (routes.py:9) 5\nmain (run.py:1) 1\n')
+
+    def test_profile_dumps_are_capped_and_private(self):
+        print("Starting profile dumps are capped and private test")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = os.path.join(tmpdir, 'profiles')
+            self.app.config.update(PROFILE_DIR=root, PROFILE_ENABLED=True, PROFILE_SAMPLE_RATE=1.0,
+                                   PROFILE_MODE='sampler', PROFILE_MAX_FILES=2)
+            headers = {'Authorization': f'Bearer {self.access_token}'}
+            for _ in range(4):
+                self.assertEqual(self.client.get('/posts', headers=headers).status_code, 200)
+            directory = os.path.join(root, 'routes.get_posts')
+            self.assertEqual(len(os.listdir(directory)), 2)
+            self.assertEqual(os.stat(root).st_mode & 0o077, 0)
+
+            # Files planted in the directory are not listed
+            os.symlink(os.path.join(tmpdir, 'elsewhere'), os.path.join(directory, 'planted.prof'))
+            token = profiler.make_token()
+            profiles = self.client.get('/admin/profiles', headers={'X-Profile-Token': token}).get_json()['profiles']
+            self.assertEqual(len(profiles), 2)
+
+            # Nothing is written to a directory other users can write to
+            shared = os.path.join(tmpdir, 'shared')
+            os.mkdir(shared)
+            os.chmod(shared, 0o777)
+            self.app.config['PROFILE_DIR'] = shared
+            response = self.client.get('/posts', headers={**headers, 'X-Profile-Token': token})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('X-Profile-File', response.headers)
+            self.assertEqual(os.listdir(shared), [])
+
+    def test_search_posts(self):
+        print("Starting search posts test")
+        headers = {'Authorization': f'Bearer {self.access_token}'}
+        posts = [
+            ('Gardening notes', 'Tomatoes need sun. Running water helps too.'),
+            ('Running in winter', 'Layers keep a runner warm on cold mornings.'),
+            ('Baking bread', 'Knead the dough and let it rise.'),
+        ]
+        ids = [self.client.post('/posts', json={'title': title, 'body': body}, headers=headers).get_json()['id'] for title, body in posts]
+        self.client.post('/posts', json={'title': 'Running club', 'body': 'Not yours'}, headers={'Authorization': f'Bearer {self.other_access_token}'})
+
+        response = self.client.get('/posts/search?q=run', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()['results']
+        # Stemmed matches only, from this user's posts, title matches ranked first
+        self.assertEqual([result['id'] for result in results], [ids[1], ids[0]])
+        self.assertEqual(results[0]['highlights']['title'], '<mark>Running</mark> in winter')
+        self.assertIn('<mark>Running</mark> water', results[1]['highlights']['body'])
+
+        # The index follows updates and deletes
+        self.client.patch(f'/posts/{ids[2]}', json={'title': 'Running late'}, headers=headers)
+        self.client.delete(f'/posts/{ids[0]}', headers=headers)
+        results = self.client.get('/posts/search?q=running', headers=headers).get_json()['results']
+        self.assertEqual(sorted(result['id'] for result in results), sorted([ids[1], ids[2]]))
+        self.assertEqual(self.client.get('/posts/search?q=tomatoes', headers=headers).get_json()['results'], [])
+
+        self.assertEqual(self.client.get('/posts/search?q=', headers=headers).status_code, 400)
+        self.assertEqual(self.client.get('/posts/search?q=run&cursor=bad', headers=headers).status_code, 400)
+
+    def test_search_highlights_escape_post_content(self):
+        print("Starting search highlights escape post content test")
+        headers = {'Authorization': f'Bearer {self.access_token}'}
+        self.client.post('/posts', json={'title': 'hello <img src=x onerror=alert(1)>', 'body': 'say hello & <b>bye</b>'}, headers=headers)
+        highlights = self.client.get('/posts/search?q=hello', headers=headers).get_json()['results'][0]['highlights']
+        self.assertEqual(highlights['title'], '<mark>hello</mark> &lt;img src=x onerror=alert(1)&gt;')
+        self.assertEqual(highlights['body'], 'say <mark>hello</mark> &amp; &lt;b&gt;bye&lt;/b&gt;')
+
+    def test_search_keyset_pagination(self):
+        print("Starting search keyset pagination test")
+        headers = {'Authorization': f'Bearer {self.access_token}'}
+        for i in range(5):
+            self.client.post('/posts', json={'title': f'Post {i}', 'body': 'search me ' * (i + 1)}, headers=headers)
+
+        seen = []
+        cursor = None
+        while True:
+            url = '/posts/search?q=search&limit=2' + (f'&cursor={cursor}' if cursor else '')
+            data = self.client.get(url, headers=headers).get_json()
+            seen.extend(result['id'] for result in data['results'])
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(sorted(seen), [1, 2, 3, 4, 5])
+        self.assertEqual(len(seen), 5)
+
+    def test_post_reads_do_not_load_orm_instances(self):
+        print("Starting post reads do not load ORM instances test")
+        headers = {'Authorization': f'Bearer {self.access_token}'}
+        for i in range(3):
+            self.client.post('/posts', json={'title': f'Post {i}', 'body': 'Body'}, headers=headers)
+        db.session.remove()
+
+        loaded = []
+        def on_load(target, context):
+            loaded.append(target)
+        event.listen(BlogPost, 'load', on_load)
+        try:
+            data = self.client.get('/posts?per_page=2&page=2', headers=headers).get_json()
+            self.assertEqual([post['title'] for post in data['posts']], ['Post 0'])
+            self.assertEqual((data['total'], data['pages'], data['current_page'], data['per_page']), (3, 2, 2, 2))
+            data = self.client.get('/posts?per_page=2&cursor=', headers=headers).get_json()
+            self.assertEqual([post['title'] for post in data['posts']], ['Post 2', 'Post 1'])
+            response = self.client.get('/posts/1?fields=title', headers=headers)
+            self.assertEqual(response.get_json(), {'title': 'Post 0'})
+        finally:
+            event.remove(BlogPost, 'load', on_load)
+        self.assertEqual(loaded, [])
+
+    def test_json_provider_matches_default_output(self):
+        print("Starting JSON provider matches default output test")
+        reference = DefaultJSONProvider(self.app)
+        row = (1, 'Caf\u00e9 "title"', datetime(2024, 2, 29, 13, 5, 9), None)
+        payload = {
+            'posts': [{'id': 1, 'title': row[1], 'timestamp': row[2], 'body': None}],
+            'when': datetime(2024, 1, 1, 12, 0, tzinfo=timezone(timedelta(hours=2))),
+            'nested': {'ok': True, 'ratio': 0.5},
+        }
+        expected = json.loads(reference.dumps(payload))
+        for accelerated in (True, False):
+            with patch.object(self.app.json, 'accelerated', accelerated and self.app.json.accelerated):
+                self.assertEqual(json.loads(self.app.json.dumps(payload)), expected)
+                self.assertEqual(json.loads(self.app.json.response(payload).get_data()), expected)
+
+    def test_json_provider_inserts_fragments(self):
+        print("Starting JSON provider inserts fragments test")
+        # Strings looking like placeholders stay plain strings
+        lookalike = '\x00abc:0\x00'
+        data = self.app.json.dumps({'cached': Fragment(b'{"a":[1,2]}'), 'text': lookalike})
+        self.assertEqual(json.loads(data), {'cached': {'a': [1, 2]}, 'text': lookalike})
+
+    def test_memoize_computes_once_for_concurrent_misses(self):
+        print("Starting memoize computes once for concurrent misses test")
+        calls = []
+
+        @memoize(timeout=60)
+        def slow_square(x):
+            calls.append(x)
+            time.sleep(0.2)
+            return x * x
+
+        results = []
+        def worker():
+            with self.app.app_context():
+                results.append(slow_square(3))
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [9, 9, 9, 9])
+        self.assertEqual(calls, [3])
+
+    def test_fetch_stops_waiting_when_lock_released_without_result(self):
+        print("Starting fetch stops waiting when lock released without result test")
+        started = threading.Event()
+        def uncacheable():
+            started.set()
+            time.sleep(0.2)
+            return None
+        def holder():
+            with self.app.app_context():
+                fetch('uncached', uncacheable, timeout=60)
+        thread = threading.Thread(target=holder)
+        thread.start()
+        started.wait()
+        start = time.monotonic()
+        self.assertEqual(fetch('uncached', lambda: 'computed', timeout=60, lock_wait=3), ('computed', 'miss'))
+        thread.join()
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_fetch_serves_stale_while_revalidating(self):
+        print("Starting fetch serves stale while revalidating test")
+        cache.set('swr', {'value': 'old', 'expires': time.time() - 1, 'delta': 0}, timeout=60)
+        # Another worker holds the lock and is recomputing: the stale value is served
+        self.assertTrue(caching._acquire('swr', 10))
+        self.assertEqual(fetch('swr', lambda: 'new', timeout=60, stale_ttl=30), ('old', 'stale'))
+        caching._release('swr')
+        self.assertEqual(fetch('swr', lambda: 'new', timeout=60, stale_ttl=30), ('new', 'miss'))
+        self.assertEqual(fetch('swr', lambda: 'newer', timeout=60, stale_ttl=30), ('new', 'hit'))
+
+    def test_fetch_expires_early(self):
+        print("Starting fetch expires early test")
+        # Fresh for one more second but took 10 seconds to compute: refreshed ahead of time
+        cache.set('early', {'value': 'old', 'expires': time.time() + 1, 'delta': 10}, timeout=60)
+        with patch('app.caching.random.random', return_value=0.5):
+            self.assertEqual(fetch('early', lambda: 'new', timeout=60, beta=0), ('old', 'hit'))
+            self.assertEqual(fetch('early', lambda: 'new', timeout=60, beta=1.0), ('new', 'miss'))
+
     def test_rate_limiting(self):
         print("Starting rate limiting test")
         for i in range(12):  # Try a couple more to ensure we hit the limit
@@ -136,5 +920,296 @@ class APITestCase(unittest.TestCase):
             self.assertIn(response.status_code, [201, 429])  # Either created or rate limited
         self.assertEqual(response.status_code, 429)  # Ensure the last request was rate limited
 
+class SQLiteRateLimitStorageTestCase(unittest.TestCase):
+    # Two storage instances on one file stand in for two worker processes
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        uri = 'sqlite:///' + os.path.join(self.tmpdir.name, 'ratelimit.db')
+        self.worker_a = SQLiteStorage(uri)
+        self.worker_b = SQLiteStorage(uri)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_fixed_window_shared_between_workers(self):
+        print("Starting fixed window shared between workers test")
+        limiter_a = FixedWindowRateLimiter(self.worker_a)
+        limiter_b = FixedWindowRateLimiter(self.worker_b)
+        limit = parse('5 per minute')
+        hits = [limiter.hit(limit, 'user:1') for limiter in [limiter_a, limiter_b] * 4]
+        self.assertEqual(hits.count(True), 5)
+        self.assertFalse(limiter_a.hit(limit, 'user:1'))
+        self.assertTrue(limiter_a.hit(limit, 'user:2'))
+
+    def test_storage_refuses_files_of_other_users(self):
+        print("Starting storage refuses files of other users test")
+        path = os.path.join(self.tmpdir.name, 'ratelimit.db')
+        self.assertEqual(os.stat(path).st_mode & 0o077, 0)
+        with patch('app.sqlite_local.os.geteuid', return_value=os.geteuid() + 1):
+            with self.assertRaises(PermissionError):
+                SQLiteStorage('sqlite:///' + path)
+
+    def test_moving_window_shared_between_workers(self):
+        print("Starting moving window shared between workers test")
+        limiter_a = MovingWindowRateLimiter(self.worker_a)
+        limiter_b = MovingWindowRateLimiter(self.worker_b)
+        limit = parse('10 per minute')
+        self.assertTrue(limiter_a.hit(limit, 'user:1', cost=6))
+        self.assertFalse(limiter_b.hit(limit, 'user:1', cost=6))
+        self.assertTrue(limiter_b.hit(limit, 'user:1', cost=4))
+        self.assertEqual(limiter_a.get_window_stats(limit, 'user:1').remaining, 0)
+
+        self.worker_b.clear(limit.key_for('user:1'))
+        self.assertTrue(limiter_a.test(limit, 'user:1', cost=10))
+
+class SQLiteCacheTestCase(unittest.TestCase):
+    # Two cache instances on one file stand in for two worker processes
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmpdir.name, 'cache.db')
+        self.worker_a = SQLiteCache(path, max_bytes=3500)
+        self.worker_b = SQLiteCache(path, max_bytes=3500)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_cache_refuses_files_of_other_users(self):
+        print("Starting cache refuses files of other users test")
+        path = os.path.join(self.tmpdir.name, 'cache.db')
+        self.assertEqual(os.stat(path).st_mode & 0o077, 0)
+        with patch('app.sqlite_local.os.geteuid', return_value=os.geteuid() + 1):
+            with self.assertRaises(PermissionError):
+                SQLiteCache(path)
+
+    def test_cache_shared_between_workers(self):
+        print("Starting cache shared between workers test")
+        self.assertTrue(self.worker_a.set('posts', {'ids': [1, 2]}))
+        self.assertEqual(self.worker_b.get('posts'), {'ids': [1, 2]})
+        self.assertFalse(self.worker_b.add('posts', 'other'))
+        self.assertEqual(self.worker_a.inc('hits'), 1)
+        self.assertEqual(self.worker_b.inc('hits', 5), 6)
+        self.assertTrue(self.worker_b.delete('posts'))
+        self.assertIsNone(self.worker_a.get('posts'))
+
+        # Expired entries are misses and can be added again
+        with patch('app.cache_backends.time.time', return_value=1000.0):
+            self.worker_a.set('short', 'value', timeout=10)
+        with patch('app.cache_backends.time.time', return_value=1011.0):
+            self.assertIsNone(self.worker_b.get('short'))
+            self.assertFalse(self.worker_b.has('short'))
+            self.assertTrue(self.worker_b.add('short', 'again'))
+            self.assertEqual(self.worker_a.get('short'), 'again')
+
+    def test_cache_evicts_least_recently_used(self):
+        print("Starting cache evicts least recently used test")
+        value = 'x' * 1000  # Three of these fit under the cap
+        for i, now in enumerate([1000.0, 1010.0, 1020.0]):
+            with patch('app.cache_backends.time.time', return_value=now):
+                self.worker_a.set(f'key{i}', value)
+        # Reading key0 makes key1 the least recently used entry
+        with patch('app.cache_backends.time.time', return_value=1030.0):
+            self.worker_b.get('key0')
+        with patch('app.cache_backends.time.time', return_value=1040.0):
+            self.worker_a.set('key3', value)
+            self.worker_a.set('key4', value)
+
+            stored = [key for key in ['key0', 'key1', 'key2', 'key3', 'key4'] if self.worker_b.has(key)]
+        self.assertEqual(stored, ['key0', 'key3', 'key4'])
+        self.assertFalse(self.worker_a.set('huge', 'x' * 5000))  # Larger than the whole cache
+
+class ReplicaRoutingTestCase(unittest.TestCase):
+    # Two SQLite files stand in for the primary and a replica that has not caught up yet
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+        class ReplicaConfig(TestConfig):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(self.tmpdir.name, 'primary.db')
+            SQLALCHEMY_BINDS = {'replica_0': 'sqlite:///' + os.path.join(self.tmpdir.name, 'replica.db')}
+            DATABASE_REPLICAS = ('replica_0',)
+            DATABASE_STATEMENT_TIMEOUT = 200
+
+        self.app = create_app(ReplicaConfig)
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.metadata.create_all(db.engines['replica_0'])
+
+        self.user = User(username='testuser@example.com')
+        self.user.set_password('testpass')
+        db.session.add(self.user)
+        db.session.add(BlogPost(title='Primary title', body='Body', user_id=1, timestamp=datetime(2024, 1, 1)))
+        db.session.commit()
+        User.adjust_post_count(self.user.id, 1)
+        db.session.commit()
+        with db.engines['replica_0'].begin() as connection:
+            connection.execute(insert(User).values(id=1, username='testuser@example.com', password_hash='x', post_count=1))
+            connection.execute(insert(BlogPost).values(id=1, title='Stale title', body='Body', user_id=1, timestamp=datetime(2024, 1, 1)))
+        self.headers = {'Authorization': f'Bearer {create_access_token(identity=self.user.id)}'}
+
+    def tearDown(self):
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+        self.app_context.pop()
+        self.tmpdir.cleanup()
+
+    def test_reads_go_to_replica_until_user_writes(self):
+        print("Starting reads go to replica until user writes test")
+        response = self.client.get('/posts/1', headers=self.headers)
+        self.assertEqual(response.get_json()['title'], 'Stale title')
+        response = self.client.get('/posts', headers=self.headers)
+        self.assertEqual(response.get_json()['posts'][0]['title'], 'Stale title')
+
+        # The write lands on the primary and makes this user's reads sticky to it
+        response = self.client.post('/posts', json={'title': 'New title', 'body': 'New body'}, headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        with db.engines['replica_0'].connect() as connection:
+            self.assertEqual(connection.execute(text('SELECT count(*) FROM blog_post')).scalar(), 1)
+        response = self.client.get('/posts/1', headers=self.headers)
+        self.assertEqual(response.get_json()['title'], 'Primary title')
+
+        # Once the stickiness window has passed, reads return to the replica
+        cache.delete('db:sticky:1')
+        response = self.client.get('/posts/1', headers=self.headers)
+        self.assertEqual(response.get_json()['title'], 'Stale title')
+
+    def test_statement_timeout(self):
+        print("Starting statement timeout test")
+        slow_query = text('WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT count(*) FROM n')
+        start = datetime.utcnow()
+        with self.app.test_request_context('/posts'):
+            with self.assertRaises(OperationalError):
+                db.session.execute(slow_query)
+            db.session.rollback()
+        self.assertLess(datetime.utcnow() - start, timedelta(seconds=5))
+
+    def test_statement_timeout_only_applies_to_requests(self):
+        print("Starting statement timeout only applies to requests test")
+        # Takes longer than the 200 ms timeout, as a migration backfill or CLI command might
+        long_query = text('WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 3000000) SELECT count(*) FROM n')
+        self.assertEqual(db.session.execute(long_query).scalar(), 3000000)
+
+class GroupCommitTestCase(unittest.TestCase):
+    # The committer thread needs its own connection to the same database, hence a file
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+        class GroupCommitConfig(TestConfig):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(self.tmpdir.name, 'blog.db')
+            GROUP_COMMIT_ENABLED = True
+            # Wide enough for every concurrent request of a test to land in one batch
+            GROUP_COMMIT_MAX_WAIT = 0.5
+
+        self.app = create_app(GroupCommitConfig)
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            # Only the default bind: another test case's replica bind stays registered on db
+            db.create_all(bind_key=None)
+            user = User(username='testuser@example.com')
+            user.set_password('testpass')
+            db.session.add(user)
+            db.session.commit()
+            self.user_id = user.id
+            self.headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+            db.session.remove()
+        metrics.reset()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def run_concurrently(self, target, count):
+        results = [None] * count
+        def worker(index):
+            results[index] = target(index)
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_creations_share_one_transaction(self):
+        print("Starting concurrent creations share one transaction test")
+        responses = self.run_concurrently(
+            lambda i: self.client.post('/posts', json={'title': f'Post {i}', 'body': 'Body'}, headers=self.headers), 4)
+        self.assertEqual([response.status_code for response in responses], [201] * 4)
+        ids = [response.get_json()['id'] for response in responses]
+        self.assertEqual(sorted(ids), [1, 2, 3, 4])
+
+        with self.app.app_context():
+            titles = {post.id: post.title for post in BlogPost.query}
+            self.assertEqual({post_id: titles[post_id] for post_id in ids}, {post_id: f'Post {i}' for i, post_id in enumerate(ids)})
+            self.assertEqual(db.session.get(User, self.user_id).post_count, 4)
+            text = metrics.render()
+        self.assertIn('group_commit_batch_size_count 1', text)
+        self.assertIn('group_commit_batch_size_sum 4', text)
+
+    def test_commit_timeout_returns_503(self):
+        print("Starting commit timeout returns 503 test")
+        self.app.config['GROUP_COMMIT_TIMEOUT'] = 0.01
+        response = self.client.post('/posts', json={'title': 'Slow', 'body': 'Body'}, headers=self.headers)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+        self.assertIn('may already exist', response.get_json()['message'])
+        # ...and indeed it is committed once the batch window closes
+        with self.app.app_context():
+            deadline = time.monotonic() + 5
+            while BlogPost.query.count() == 0 and time.monotonic() < deadline:
+                db.session.remove()
+                time.sleep(0.05)
+            self.assertEqual(BlogPost.query.count(), 1)
+
+    def test_failed_post_does_not_fail_its_batch(self):
+        print("Starting failed post does not fail its batch test")
+        def create(index):
+            with self.app.app_context():
+                try:
+                    # A missing title violates NOT NULL
+                    return group_committer.create_post(None if index == 0 else 'Title', 'Body', self.user_id)
+                except Exception as e:
+                    return e
+        results = self.run_concurrently(create, 3)
+        self.assertIsInstance(results[0], IntegrityError)
+        self.assertEqual(sorted(results[1:]), [1, 2])
+        with self.app.app_context():
+            self.assertEqual(BlogPost.query.count(), 2)
+            self.assertEqual(db.session.get(User, self.user_id).post_count, 2)
+            self.assertIn('group_commit_batches_total{result="retried"} 1', metrics.render())
+
+class ServerHooksTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+        class ServerConfig(TestConfig):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(self.tmpdir.name, 'blog.db')
+
+        self.app = create_app(ServerConfig)
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def test_worker_warms_up_and_shuts_down(self):
+        print("Starting worker warms up and shuts down test")
+        after_fork(self.app)
+        warm_up(self.app)
+        with self.app.app_context():
+            self.assertEqual(db.engine.pool.checkedin(), self.app.config['SERVER_WARM_CONNECTIONS'])
+        # A fresh fork forgets the inherited connections
+        after_fork(self.app)
+        with self.app.app_context():
+            self.assertEqual(db.engine.pool.checkedin(), 0)
+        warm_up(self.app)
+        with patch.object(request_logging, 'stop') as stop:
+            shutdown(self.app)
+        stop.assert_called_once()
+        with self.app.app_context():
+            self.assertEqual(db.engine.pool.checkedin(), 0)
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
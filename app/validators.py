@@ -0,0 +1,18 @@
+from app.models import BlogPost
+
+# Function to validate a single field of a post, returning an error message or None
+def validate_post_field(name, value):
+    label = name.capitalize()
+    if not value:
+        return f'{label} must not be empty'
+    if not isinstance(value, str):
+        return f'{label} must be a string'
+    if name == 'title' and len(value) > BlogPost.title.type.length:
+        return f'{label} must be at most {BlogPost.title.type.length} characters long'
+    return None
+
+# Function to validate the fields of a post, returning an error message or None
+def validate_post_fields(title, body):
+    if not title or not body:
+        return 'Title and body are required'
+    return validate_post_field('title', title) or validate_post_field('body', body)
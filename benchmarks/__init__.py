@@ -0,0 +1 @@
+# Benchmarks for the Blog API. Run a module with: python -m benchmarks.<name> --help
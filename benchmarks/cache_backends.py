@@ -0,0 +1,78 @@
+# Compares the per-operation cost of the cache backends and the hit rate several
+# worker processes get when they share (or do not share) one cache.
+#
+#   python -m benchmarks.cache_backends --ops 1000 --workers 4
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from cachelib import SimpleCache, FileSystemCache
+from app.cache_backends import SQLiteCache
+
+# A cached GET /posts page is a few kilobytes of JSON
+VALUE = {'body': b'x' * 4096, 'status': 200, 'headers': [('Content-Type', 'application/json')]}
+
+# FileSystemCache runs unbounded (threshold=0): with an entry threshold it keeps a file count
+# up to date on every set, which costs tens of milliseconds per set here
+def make_backends(tmpdir):
+    os.makedirs(tmpdir, exist_ok=True)
+    return {
+        'simple': lambda: SimpleCache(threshold=100000),
+        'filesystem': lambda: FileSystemCache(os.path.join(tmpdir, 'fs'), threshold=0),
+        'sqlite': lambda: SQLiteCache(os.path.join(tmpdir, 'cache.db'), max_bytes=256 * 1024 * 1024),
+    }
+
+# Time `ops` sets then `ops` gets over 1000 keys, returning microseconds per operation
+def time_ops(cache, ops):
+    start = time.perf_counter()
+    for i in range(ops):
+        cache.set(f'key:{i % 1000}', VALUE)
+    set_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(ops):
+        cache.get(f'key:{i % 1000}')
+    get_time = time.perf_counter() - start
+    return set_time / ops * 1e6, get_time / ops * 1e6
+
+def _worker(factory, index, requests, results):
+    cache = factory()
+    hits = 0
+    for i in range(requests):
+        key = f'page:{(i + index) % 50}'
+        if cache.get(key) is not None:
+            hits += 1
+        else:
+            cache.set(key, VALUE)
+    results.put(hits)
+
+# Every worker reads the same 50 pages, filling the cache on a miss; return the overall hit rate
+def hit_rate_across_workers(factory, workers, requests=500):
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(factory, i, requests, results)) for i in range(workers)]
+    for process in processes:
+        process.start()
+    hits = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return hits / (workers * requests)
+
+def main():
+    parser = argparse.ArgumentParser(description='Cache backend benchmark')
+    parser.add_argument('--ops', type=int, default=1000, help='sets and gets timed per backend')
+    parser.add_argument('--workers', type=int, default=4, help='processes reading the same pages')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        print(f"{'backend':<11} {'us/set':>8} {'us/get':>8} {'shared hit rate':>16}")
+        # Each measurement gets fresh, empty caches
+        timed = make_backends(os.path.join(tmpdir, 'ops'))
+        shared = make_backends(os.path.join(tmpdir, 'shared'))
+        for name in timed:
+            per_set, per_get = time_ops(timed[name](), args.ops)
+            hit_rate = hit_rate_across_workers(shared[name], args.workers)
+            print(f'{name:<11} {per_set:>8.1f} {per_get:>8.1f} {hit_rate:>16.1%}')
+
+if __name__ == '__main__':
+    main()
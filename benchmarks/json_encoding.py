@@ -0,0 +1,64 @@
+# Compares encoding a large GET /posts listing with Flask's default JSON provider, with
+# app.json_provider.JSONProvider on the standard library and on orjson (when installed),
+# and with the listing inserted as a pre-encoded Fragment.
+#
+#   python -m benchmarks.json_encoding --posts 100 --body-size 1500 --rounds 200
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from app.json_provider import JSONProvider, Fragment, orjson
+from app.routes import POST_FIELDS
+from benchmarks.load.seed import make_text
+
+def make_rows(posts, body_size, seed=42):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    return [(i, make_text(rng, rng.randint(20, 100)), make_text(rng, body_size), start + timedelta(seconds=rng.randrange(365 * 24 * 3600)))
+            for i in range(1, posts + 1)]
+
+def listing(posts):
+    return {'posts': posts, 'total': 1000, 'pages': 10, 'current_page': 1, 'per_page': 100}
+
+# Time `rounds` encodings of the payload built by build(); returns (ms per payload, MB/s)
+def time_encoding(encode, build, rounds):
+    size = len(encode(build()))
+    start = time.perf_counter()
+    for _ in range(rounds):
+        encode(build())
+    elapsed = time.perf_counter() - start
+    return elapsed / rounds * 1000, size * rounds / elapsed / 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON provider benchmark')
+    parser.add_argument('--posts', type=int, default=100, help='posts in the listing')
+    parser.add_argument('--body-size', type=int, default=1500, help='post body length in characters')
+    parser.add_argument('--rounds', type=int, default=200, help='encodings timed per variant')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    default = DefaultJSONProvider(app)
+    stdlib = JSONProvider(app)
+    stdlib.accelerated = False
+    fast = JSONProvider(app)
+    rows = make_rows(args.posts, args.body_size)
+    to_dicts = lambda: listing([dict(zip(POST_FIELDS, row)) for row in rows])
+    cached = Fragment(fast.encode([dict(zip(POST_FIELDS, row)) for row in rows]))
+
+    variants = [
+        ('default provider, dicts', default.dumps, to_dicts),
+        ('stdlib provider, dicts', stdlib.encode, to_dicts),
+    ]
+    if orjson is not None:
+        variants.append(('orjson provider, dicts', fast.encode, to_dicts))
+    variants.append(('cached Fragment', fast.encode, lambda: listing(cached)))
+
+    print(f"{'variant':<26} {'ms/payload':>11} {'MB/s':>8}")
+    for name, encode, build in variants:
+        per_payload, throughput = time_encoding(encode, build, args.rounds)
+        print(f'{name:<26} {per_payload:>11.3f} {throughput:>8.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+# Load benchmark of every API endpoint: python -m benchmarks.load --help
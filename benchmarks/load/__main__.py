@@ -0,0 +1,199 @@
+# Seeds a dataset, drives every endpoint concurrently through the WSGI app and a real
+# local HTTP server (or an external one with --url) and reports throughput and latency
+# percentiles per endpoint as JSON. With --baseline it exits non-zero on regressions.
+#
+#   python -m benchmarks.load --users 20 --posts 200 --requests 500 --output run.json
+#   python -m benchmarks.load --output new.json --baseline run.json --threshold 0.2
+#   python -m benchmarks.load --database-url postgresql://blog_user:pw@localhost/bench_db --reset
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app import create_app, db
+from config import Config
+from benchmarks.load.endpoints import ENDPOINTS, Dataset, missing_endpoints
+from benchmarks.load.seed import seed
+from benchmarks.load.transports import WSGITransport, HTTPTransport, local_server
+
+# Production settings, minus the rate limits (they would turn the benchmark into a 429
+# benchmark), with a connection per client thread as a worker has per request thread and
+# with every file the app writes kept in a scratch directory
+def bench_config(database_url, workdir, concurrency):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        SQLALCHEMY_ENGINE_OPTIONS = {**Config.SQLALCHEMY_ENGINE_OPTIONS, 'pool_size': concurrency + 1}
+        RATELIMIT_ENABLED = False
+        CACHE_SQLITE_PATH = os.path.join(workdir, 'cache.db')
+        RATELIMIT_STORAGE_URI = 'sqlite:///' + os.path.join(workdir, 'ratelimit.db')
+        LOG_FILE = os.path.join(workdir, 'logs', 'blog_api.log')
+        METRICS_DIR = os.path.join(workdir, 'metrics')
+        PROFILE_DIR = os.path.join(workdir, 'profiles')
+    return BenchConfig
+
+# Nearest-rank percentile of an already sorted list
+def percentile(values, fraction):
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, int(round(fraction * len(values) + 0.5)) - 1))
+    return values[index]
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors,
+        'throughput_rps': round(count / elapsed, 2) if elapsed else None,
+        'mean_ms': round(sum(latencies) / count * 1000, 3) if count else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3) if count else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3) if count else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3) if count else None,
+    }
+
+# Send `requests` requests to one endpoint from `concurrency` threads; only the request
+# itself is timed, not building it (which may include setup requests)
+def run_endpoint(transport, endpoint, dataset, requests, concurrency, seed):
+    remaining = iter(range(requests))
+    lock = threading.Lock()
+    latencies = []
+    errors = []
+
+    def worker(index):
+        rng = random.Random(f'{seed}:{endpoint.name}:{index}')
+        local_latencies = []
+        local_errors = 0
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    break
+            user = rng.choice(dataset.users)
+            kwargs = endpoint.build(dataset, rng, user, transport)
+            headers = dict(kwargs.pop('headers', {}))
+            if endpoint.auth:
+                headers['Authorization'] = f"Bearer {user['token']}"
+            start = time.perf_counter()
+            status, _ = transport.request(endpoint.method, kwargs.pop('path'), headers=headers, **kwargs)
+            local_latencies.append(time.perf_counter() - start)
+            if status not in endpoint.expect:
+                local_errors += 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors.append(local_errors)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    return summarize(latencies, sum(errors), time.perf_counter() - start)
+
+def run_transport(transport, dataset, args):
+    results = {}
+    for endpoint in ENDPOINTS:
+        if args.endpoint and endpoint.name not in args.endpoint:
+            continue
+        requests = max(args.min_requests, int(args.requests * endpoint.weight))
+        run_endpoint(transport, endpoint, dataset, args.warmup, args.concurrency, args.seed)
+        results[endpoint.name] = run_endpoint(transport, endpoint, dataset, requests, args.concurrency, args.seed)
+        print(f"{transport.name:<5} {endpoint.name:<22} {format_result(results[endpoint.name])}", file=sys.stderr)
+    return results
+
+def format_result(result):
+    return (f"{result['throughput_rps'] or 0:>9.1f} req/s  p50 {result['p50_ms'] or 0:>8.2f} ms"
+            f"  p95 {result['p95_ms'] or 0:>8.2f} ms  p99 {result['p99_ms'] or 0:>8.2f} ms  errors {result['errors']}")
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Compare p95 latency and throughput against a baseline run; return the regressions found
+def find_regressions(baseline, current, threshold):
+    regressions = []
+    for transport, endpoints in current['results'].items():
+        for name, result in endpoints.items():
+            before = baseline.get('results', {}).get(transport, {}).get(name)
+            if not before or not before.get('p95_ms') or not result.get('p95_ms'):
+                continue
+            if result['p95_ms'] > before['p95_ms'] * (1 + threshold):
+                regressions.append(f"{transport} {name}: p95 {before['p95_ms']} ms -> {result['p95_ms']} ms")
+            if before.get('throughput_rps') and result['throughput_rps'] < before['throughput_rps'] * (1 - threshold):
+                regressions.append(f"{transport} {name}: throughput {before['throughput_rps']} -> {result['throughput_rps']} req/s")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Load benchmark of every API endpoint')
+    parser.add_argument('--database-url', help='database to seed and serve from (default: a fresh SQLite file)')
+    parser.add_argument('--reset', action='store_true', help='drop and recreate the tables before seeding')
+    parser.add_argument('--users', type=int, default=10, help='users to seed')
+    parser.add_argument('--posts', type=int, default=100, help='posts to seed per user')
+    parser.add_argument('--body-size', type=int, default=1500, help='average post body length in characters')
+    parser.add_argument('--seed', type=int, default=42, help='random seed for the dataset and the request mix')
+    parser.add_argument('--requests', type=int, default=300, help='requests per endpoint before weighting')
+    parser.add_argument('--min-requests', type=int, default=20, help='lower bound of requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=5, help='untimed requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent client threads')
+    parser.add_argument('--transport', choices=['wsgi', 'http', 'both'], default='both', help='how requests reach the app')
+    parser.add_argument('--url', help='benchmark an already running server (sharing --database-url) instead of a local one')
+    parser.add_argument('--endpoint', action='append', help='only this endpoint, e.g. "GET /posts" (repeatable)')
+    parser.add_argument('--output', help='write the results as JSON to this file (default: stdout)')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative slowdown before a regression is reported')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        database_url = args.database_url or 'sqlite:///' + os.path.join(workdir, 'bench.db')
+        app = create_app(bench_config(database_url, workdir, args.concurrency))
+        missing = missing_endpoints(app)
+        if missing:
+            sys.exit(f"No benchmark for {', '.join(missing)}; add it to ENDPOINTS in benchmarks/load/endpoints.py")
+        with app.app_context():
+            users = seed(args.users, args.posts, body_size=args.body_size, seed=args.seed, reset=args.reset)
+            dataset = Dataset(users)
+            db.session.remove()
+
+        results = {}
+        if args.transport in ('wsgi', 'both'):
+            results['wsgi'] = run_transport(WSGITransport(app), dataset, args)
+        if args.transport in ('http', 'both'):
+            if args.url:
+                results['http'] = run_transport(HTTPTransport(args.url), dataset, args)
+            else:
+                with local_server(app) as url:
+                    results['http'] = run_transport(HTTPTransport(url), dataset, args)
+
+    report = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            # Scheme and host only, so credentials never end up in result files
+            'database': database_url.split(':', 1)[0] if not args.database_url else args.database_url.split(':', 1)[0] + '://' + args.database_url.split('@')[-1],
+            'args': {name: value for name, value in vars(args).items() if name not in ('output', 'baseline', 'database_url')},
+        },
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(json.load(f), report, args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f'No regressions beyond {args.threshold:.0%} against {args.baseline}', file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
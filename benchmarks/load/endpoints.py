@@ -0,0 +1,139 @@
+import itertools
+import json
+import re
+from flask_jwt_extended import create_access_token
+from app import db
+from app.models import User, BlogPost
+from app.profiling import profiler
+from app.routes import encode_cursor
+from benchmarks.load.seed import PASSWORD, WORDS, make_text
+
+# What the endpoints need to build requests: seeded users with tokens, their post ids
+# and a pagination cursor. Built inside an app context after seeding.
+class Dataset:
+    def __init__(self, users, per_page=20):
+        self.users = []
+        for user_id, email in users:
+            posts = (BlogPost.query.filter_by(user_id=user_id)
+                     .order_by(BlogPost.timestamp.desc(), BlogPost.id.desc()).limit(per_page).all())
+            self.users.append({
+                'id': user_id,
+                'email': email,
+                'token': create_access_token(identity=user_id, additional_claims={'tier': db.session.get(User, user_id).tier}),
+                'post_ids': [post.id for post in posts],
+                'cursor': encode_cursor(posts[-1]) if posts else ''
+            })
+        self.per_page = per_page
+        self.profile_token = profiler.make_token()
+        self._emails = itertools.count()
+
+    def new_email(self):
+        return f'signup-{next(self._emails)}@example.com'
+
+# One benchmarked route. build(dataset, rng, user, transport) returns the keyword arguments of
+# transport.request (path, json_body, data, headers); it may issue untimed setup requests.
+# weight scales the number of requests relative to --requests.
+class Endpoint:
+    def __init__(self, name, method, build, expect=(200,), weight=1.0, auth=True):
+        self.name = name
+        self.method = method
+        self.build = build
+        self.expect = expect
+        self.weight = weight
+        self.auth = auth
+
+def _post(rng):
+    return {'title': make_text(rng, rng.randint(20, 100)), 'body': make_text(rng, rng.randint(500, 2500))}
+
+def _create_post(transport, user, rng):
+    status, body = transport.request('POST', '/posts', headers={'Authorization': f"Bearer {user['token']}"}, json_body=_post(rng))
+    return json.loads(body)['id']
+
+def signup(dataset, rng, user, transport):
+    return {'path': '/signup', 'json_body': {'email': dataset.new_email(), 'password': PASSWORD}}
+
+def login(dataset, rng, user, transport):
+    return {'path': '/login', 'json_body': {'email': user['email'], 'password': PASSWORD}}
+
+def create_post(dataset, rng, user, transport):
+    return {'path': '/posts', 'json_body': _post(rng)}
+
+def create_batch(dataset, rng, user, transport):
+    return {'path': '/posts/batch', 'json_body': [_post(rng) for _ in range(10)]}
+
+def import_posts(dataset, rng, user, transport):
+    lines = ''.join(json.dumps(_post(rng)) + '\n' for _ in range(20))
+    return {'path': '/posts/import', 'data': lines.encode('utf-8'), 'headers': {'Content-Type': 'application/x-ndjson'}}
+
+def list_posts(dataset, rng, user, transport):
+    return {'path': f'/posts?page={rng.randint(1, 5)}&per_page={dataset.per_page}'}
+
+def list_posts_cursor(dataset, rng, user, transport):
+    return {'path': f"/posts?cursor={user['cursor']}&per_page={dataset.per_page}"}
+
+def list_posts_fields(dataset, rng, user, transport):
+    return {'path': f'/posts?page={rng.randint(1, 5)}&per_page={dataset.per_page}&fields=id,title'}
+
+# Seeded posts are made of WORDS, so one or two of them usually match something
+def search_posts(dataset, rng, user, transport):
+    return {'path': f"/posts/search?q={'+'.join(rng.sample(WORDS, rng.randint(1, 2)))}&limit={dataset.per_page}"}
+
+def export_posts(dataset, rng, user, transport):
+    return {'path': '/posts/export'}
+
+def get_post(dataset, rng, user, transport):
+    return {'path': f"/posts/{rng.choice(user['post_ids'])}"}
+
+def replace_post(dataset, rng, user, transport):
+    return {'path': f"/posts/{rng.choice(user['post_ids'])}", 'json_body': _post(rng)}
+
+def patch_post(dataset, rng, user, transport):
+    return {'path': f"/posts/{rng.choice(user['post_ids'])}", 'json_body': {'title': make_text(rng, 40)}}
+
+def delete_post(dataset, rng, user, transport):
+    return {'path': f'/posts/{_create_post(transport, user, rng)}'}
+
+def cache_stats(dataset, rng, user, transport):
+    return {'path': '/cache/stats'}
+
+def metrics(dataset, rng, user, transport):
+    return {'path': '/metrics'}
+
+def list_profiles(dataset, rng, user, transport):
+    return {'path': '/admin/profiles', 'headers': {'X-Profile-Token': dataset.profile_token}}
+
+# Every route of the blueprint. Password hashing makes signup and login expensive by
+# design, so they get fewer requests; writes are weighted below reads as in real traffic.
+ENDPOINTS = [
+    Endpoint('POST /signup', 'POST', signup, expect=(201,), weight=0.1, auth=False),
+    Endpoint('POST /login', 'POST', login, weight=0.1, auth=False),
+    Endpoint('POST /posts', 'POST', create_post, expect=(201,), weight=0.5),
+    Endpoint('POST /posts/batch', 'POST', create_batch, expect=(201,), weight=0.2),
+    Endpoint('POST /posts/import', 'POST', import_posts, weight=0.1),
+    Endpoint('GET /posts', 'GET', list_posts),
+    Endpoint('GET /posts?cursor', 'GET', list_posts_cursor),
+    Endpoint('GET /posts?fields', 'GET', list_posts_fields),
+    Endpoint('GET /posts/export', 'GET', export_posts, weight=0.1),
+    Endpoint('GET /posts/search', 'GET', search_posts),
+    Endpoint('GET /posts/<id>', 'GET', get_post),
+    Endpoint('PUT /posts/<id>', 'PUT', replace_post, weight=0.5),
+    Endpoint('PATCH /posts/<id>', 'PATCH', patch_post, weight=0.5),
+    Endpoint('DELETE /posts/<id>', 'DELETE', delete_post, weight=0.2),
+    Endpoint('GET /cache/stats', 'GET', cache_stats, weight=0.2),
+    Endpoint('GET /metrics', 'GET', metrics, weight=0.2, auth=False),
+    Endpoint('GET /admin/profiles', 'GET', list_profiles, weight=0.1, auth=False),
+]
+
+# Routes of the app (as "METHOD /rule", converters dropped) without an entry in ENDPOINTS,
+# so a new route cannot silently go unbenchmarked
+def missing_endpoints(app):
+    covered = {endpoint.name.split('?')[0] for endpoint in ENDPOINTS}
+    missing = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint == 'static':
+            continue
+        path = re.sub(r'<(?:[^:>]+:)?([^>]+)>', r'<\1>', rule.rule)
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            if f'{method} {path}' not in covered:
+                missing.append(f'{method} {path}')
+    return missing
@@ -0,0 +1,62 @@
+import random
+import string
+from datetime import datetime, timedelta
+from sqlalchemy import insert, update
+from app import db, hasher
+from app.models import User, BlogPost
+
+# Password shared by every seeded user; hashed once since hashing is deliberately slow
+PASSWORD = 'benchmark-password'
+
+_words = random.Random(0)
+WORDS = [''.join(_words.choices(string.ascii_lowercase, k=_words.randint(2, 10))) for _ in range(2000)]
+
+# Text of roughly `size` characters made of words, the way post bodies look
+def make_text(rng, size):
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)[:size]
+
+# Seed `users` users with `posts_per_user` posts each, deterministically for a given seed.
+# Body lengths vary around body_size (half to one and a half times), timestamps span a year.
+# Must run inside an app context; returns [(user_id, email)].
+def seed(users, posts_per_user, body_size=1500, seed=42, reset=False, chunk_size=1000):
+    rng = random.Random(seed)
+    if reset:
+        db.drop_all()
+    db.create_all()
+
+    password_hash = hasher.hash(PASSWORD)
+    emails = [f'bench-{seed}-{i}@example.com' for i in range(users)]
+    existing = {user.username: user.id for user in User.query.filter(User.username.in_(emails))}
+    missing = [{'username': email, 'password_hash': password_hash} for email in emails if email not in existing]
+    if missing:
+        db.session.execute(insert(User), missing)
+        db.session.commit()
+        existing = {user.username: user.id for user in User.query.filter(User.username.in_(emails))}
+
+    start = datetime(2024, 1, 1)
+    for email in emails:
+        user_id = existing[email]
+        if db.session.get(User, user_id).post_count:
+            continue  # Seeded by an earlier run
+        rows = []
+        for _ in range(posts_per_user):
+            rows.append({
+                'title': make_text(rng, rng.randint(20, 100)),
+                'body': make_text(rng, rng.randint(body_size // 2, body_size * 3 // 2)),
+                'timestamp': start + timedelta(seconds=rng.randrange(365 * 24 * 3600)),
+                'user_id': user_id
+            })
+            if len(rows) == chunk_size:
+                db.session.execute(insert(BlogPost), rows)
+                rows = []
+        if rows:
+            db.session.execute(insert(BlogPost), rows)
+        db.session.execute(update(User).where(User.id == user_id).values(post_count=posts_per_user))
+        db.session.commit()
+    return [(existing[email], email) for email in emails]
@@ -0,0 +1,78 @@
+import http.client
+import json
+import threading
+import urllib.parse
+from contextlib import contextmanager
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+# Every transport exposes request(method, path, headers, json_body, data) -> (status, body)
+# and is safe to call from several threads at once.
+
+# Calls the WSGI app in-process through Flask's test client: no sockets or HTTP parsing,
+# so it measures the application itself
+class WSGITransport:
+    name = 'wsgi'
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, headers=None, json_body=None, data=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, headers=headers, json=json_body, data=data)
+        return response.status_code, response.get_data()
+
+# Talks HTTP/1.1 with keep-alive to a server, one connection per thread
+class HTTPTransport:
+    name = 'http'
+
+    def __init__(self, base_url):
+        parts = urllib.parse.urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        return connection
+
+    def request(self, method, path, headers=None, json_body=None, data=None):
+        headers = dict(headers or {})
+        if json_body is not None:
+            data = json.dumps(json_body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request(method, path, body=data, headers=headers)
+                response = connection.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                # The server closed an idle keep-alive connection; reconnect once
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+# Serve the app on a free local port with werkzeug's threaded server for the duration
+# of the block, yielding its base URL
+@contextmanager
+def local_server(app):
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=KeepAliveRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, name='benchmark-server', daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.port}'
+    finally:
+        server.shutdown()
+        thread.join()
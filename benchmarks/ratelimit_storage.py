@@ -0,0 +1,62 @@
+# Measures the per-check cost of the rate limit storages and how many hits several
+# worker processes let through for one shared limit.
+#
+#   python -m benchmarks.ratelimit_storage --checks 20000 --workers 4
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import STRATEGIES
+import app.limiter_storage  # Registers the sqlite:// scheme
+
+STRATEGY_NAMES = ('fixed-window', 'moving-window')
+
+# Time `checks` hits against a limit that is never reached, returning microseconds per check
+def time_checks(uri, strategy, checks):
+    limiter = STRATEGIES[strategy](storage_from_string(uri))
+    limit = parse(f'{checks * 10} per hour')
+    start = time.perf_counter()
+    for i in range(checks):
+        limiter.hit(limit, f'user:{i % 100}')
+    return (time.perf_counter() - start) / checks * 1e6
+
+def _hammer(uri, strategy, attempts, results):
+    limiter = STRATEGIES[strategy](storage_from_string(uri))
+    limit = parse('100 per hour')
+    results.put(sum(limiter.hit(limit, 'shared') for _ in range(attempts)))
+
+# Let every worker try to exceed one 100/hour limit and return the total number of allowed hits
+def allowed_across_workers(uri, strategy, workers, attempts=100):
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    processes = [context.Process(target=_hammer, args=(uri, strategy, attempts, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    allowed = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return allowed
+
+def main():
+    parser = argparse.ArgumentParser(description='Rate limit storage benchmark')
+    parser.add_argument('--checks', type=int, default=20000, help='hits timed per storage and strategy')
+    parser.add_argument('--workers', type=int, default=4, help='processes sharing one limit')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        storages = {
+            'memory': 'memory://',
+            'sqlite': 'sqlite:///' + os.path.join(tmpdir, 'ratelimit.db'),
+        }
+        print(f"{'storage':<8} {'strategy':<14} {'us/check':>9} {'allowed of 100/hour':>20}")
+        for name, uri in storages.items():
+            for strategy in STRATEGY_NAMES:
+                per_check = time_checks(uri, strategy, args.checks)
+                allowed = allowed_across_workers(uri, strategy, args.workers)
+                print(f'{name:<8} {strategy:<14} {per_check:>9.1f} {allowed:>20}')
+
+if __name__ == '__main__':
+    main()
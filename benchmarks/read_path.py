@@ -0,0 +1,85 @@
+# Compares loading and serializing a page of posts through ORM instances (the former
+# read path of GET /posts) with the Core row path in app/queries.py: rows per second,
+# plus memory blocks allocated and peak memory per page as traced by tracemalloc.
+#
+#   python -m benchmarks.read_path --posts 1000 --per-page 100 --pages 200
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from sqlalchemy.orm import load_only
+from app import create_app, db
+from app.models import BlogPost
+from app.queries import page_posts, serialize_row
+from app.routes import POST_FIELDS, serialize_post
+from benchmarks.load.seed import seed
+from config import Config
+
+def orm_page(user_id, page, per_page):
+    posts = (BlogPost.query.filter_by(user_id=user_id)
+             .order_by(BlogPost.timestamp.desc(), BlogPost.id.desc())
+             .options(load_only(*[getattr(BlogPost, name) for name in POST_FIELDS]))
+             .limit(per_page).offset((page - 1) * per_page).all())
+    return [serialize_post(post) for post in posts]
+
+def core_page(user_id, page, per_page):
+    rows = page_posts(user_id, POST_FIELDS, page, per_page, per_page)[0]
+    return [serialize_row(row, POST_FIELDS) for row in rows]
+
+PATHS = {'orm': orm_page, 'core': core_page}
+
+# Load `pages` pages, cycling through the user's posts; the session is cleared after each
+# page as it is at the end of a request. Returns rows per second.
+def time_path(load, user_id, per_page, pages, page_count):
+    rows = 0
+    start = time.perf_counter()
+    for i in range(pages):
+        rows += len(load(user_id, i % page_count + 1, per_page))
+        db.session.remove()
+    return rows / (time.perf_counter() - start)
+
+# Memory blocks allocated (and not freed before the page is serialized) and peak bytes for one page
+def trace_path(load, user_id, per_page):
+    load(user_id, 1, per_page)
+    db.session.remove()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = load(user_id, 1, per_page)
+    after = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+    del result
+    db.session.remove()
+    return blocks, peak
+
+def main():
+    parser = argparse.ArgumentParser(description='ORM vs Core read path benchmark')
+    parser.add_argument('--posts', type=int, default=1000, help='posts seeded for the benchmarked user')
+    parser.add_argument('--per-page', type=int, default=100, help='posts per page')
+    parser.add_argument('--pages', type=int, default=200, help='pages loaded per path')
+    parser.add_argument('--body-size', type=int, default=1500, help='average post body length in characters')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+            CACHE_SQLITE_PATH = os.path.join(workdir, 'cache.db')
+            RATELIMIT_STORAGE_URI = 'sqlite:///' + os.path.join(workdir, 'ratelimit.db')
+            LOG_FILE = os.path.join(workdir, 'logs', 'blog_api.log')
+            METRICS_DIR = None
+            PROFILE_DIR = os.path.join(workdir, 'profiles')
+
+        app = create_app(BenchConfig)
+        with app.app_context():
+            user_id = seed(1, args.posts, body_size=args.body_size)[0][0]
+            page_count = max(1, args.posts // args.per_page)
+            print(f"{'path':<5} {'rows/s':>10} {'blocks/page':>12} {'peak KiB/page':>14}")
+            for name, load in PATHS.items():
+                rate = time_path(load, user_id, args.per_page, args.pages, page_count)
+                blocks, peak = trace_path(load, user_id, args.per_page)
+                print(f'{name:<5} {rate:>10.0f} {blocks:>12} {peak / 1024:>14.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -9,22 +9,174 @@ class Config:
     
     # Disable modification tracking to save resources
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Production server (gunicorn -c gunicorn.conf.py wsgi:app): listen address, worker
+    # processes forked from the preloaded app (default two per core plus one) and threads
+    # per worker, requests after which a worker is replaced (plus up to the jitter, so
+    # workers do not all restart at once), seconds a silent worker may hang before it is
+    # killed, seconds workers get to finish in-flight requests on shutdown, and database
+    # connections each worker opens before it accepts traffic
+    SERVER_BIND = os.environ.get('BIND') or '0.0.0.0:8000'
+    SERVER_WORKERS = int(os.environ.get('WEB_CONCURRENCY') or (os.cpu_count() or 1) * 2 + 1)
+    SERVER_THREADS = int(os.environ.get('SERVER_THREADS') or 4)
+    SERVER_MAX_REQUESTS = 10000
+    SERVER_MAX_REQUESTS_JITTER = 1000
+    SERVER_TIMEOUT = 30
+    SERVER_GRACEFUL_TIMEOUT = 30
+    SERVER_WARM_CONNECTIONS = 2
+
+    # Connection pool of every engine, per worker process: connections kept open (default
+    # one per request thread plus one for the group-commit thread, the most a worker can
+    # use at once), extra connections allowed under load, seconds to wait for a free
+    # connection, seconds before a connection is replaced and a liveness check on checkout
+    # so connections dropped by the server are not handed out. SERVER_WORKERS times
+    # pool_size + max_overflow must stay within DATABASE_MAX_CONNECTIONS, the database
+    # server's limit (PostgreSQL's max_connections); gunicorn.conf.py warns otherwise.
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DATABASE_POOL_SIZE') or SERVER_THREADS + 1),
+        'max_overflow': int(os.environ.get('DATABASE_MAX_OVERFLOW') or 0),
+        'pool_timeout': 10,
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+    }
+    DATABASE_MAX_CONNECTIONS = int(os.environ.get('DATABASE_MAX_CONNECTIONS') or 100)
+
+    # Milliseconds after which a single SQL statement run by a request is aborted (0 disables);
+    # CLI commands and migrations are not limited
+    DATABASE_STATEMENT_TIMEOUT = int(os.environ.get('DATABASE_STATEMENT_TIMEOUT') or 5000)
+
+    # Read replicas, as a comma-separated REPLICA_DATABASE_URLS, become the binds replica_0,
+    # replica_1, ... Read-only views are served from them, except for users who wrote in the
+    # last DATABASE_STICKY_SECONDS (roughly the replication lag), who read from the primary.
+    SQLALCHEMY_BINDS = {f'replica_{i}': url for i, url in enumerate(filter(None, (os.environ.get('REPLICA_DATABASE_URLS') or '').split(',')))}
+    DATABASE_REPLICAS = tuple(SQLALCHEMY_BINDS)
+    DATABASE_STICKY_SECONDS = 5
     
     # Secret key for JWT authentication
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'your_jwt_secret_key'
     
-    # Cache configuration for Flask-Caching
-    CACHE_TYPE = 'simple'  
+    # Cache configuration for Flask-Caching: a SQLite file shared by every worker process
+    # on the host (see app/cache_backends.py), capped at CACHE_MAX_BYTES of stored values.
+    # The file defaults to cache.db in the app's instance folder; it must be private to the
+    # app's user, so never point it into a shared directory such as /tmp.
+    CACHE_TYPE = 'app.cache_backends.SQLiteCache'
+    CACHE_SQLITE_PATH = os.environ.get('CACHE_SQLITE_PATH')
+    CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES') or 64 * 1024 * 1024)
+    CACHE_DEFAULT_TIMEOUT = 300
+
+    # Stampede protection of cached reads (see fetch() in app/caching.py): seconds an expired
+    # entry may still be served while one request recomputes it, early expiration eagerness
+    # (0 disables it), lifetime of the recomputation lock and how long requests finding
+    # nothing cached wait for the lock holder before computing themselves
+    CACHE_STALE_TTL = 30
+    CACHE_EARLY_EXPIRATION_BETA = 1.0
+    CACHE_LOCK_TIMEOUT = 10
+    CACHE_LOCK_WAIT = 5
     
     # Enable headers for rate limiting in Flask-Limiter
     RATELIMIT_HEADERS_ENABLED = True  
 
+    # Rate limit counters shared by all worker processes on the host (see app/limiter_storage.py).
+    # The moving window is served by an O(1) sliding window counter in that storage. The
+    # database defaults to ratelimit.db in the app's instance folder; like the cache, it
+    # must be private to the app's user, so never point it into a shared directory.
+    RATELIMIT_STORAGE_URI = os.environ.get('RATELIMIT_STORAGE_URI')
+    RATELIMIT_STRATEGY = 'moving-window'
+
+    # Per-user limits by tier (from the 'tier' claim of the access token). Routes charge a
+    # cost against a bucket shared by all routes in it: 'read' (GET /posts costs 1 as it is
+    # usually cached, GET /posts/<id> costs 2), 'write' (1 per post, so a batch costs its
+    # size) and 'bulk' (imports and exports). Keep every 'write' budget at or above
+    # POSTS_BATCH_MAX_SIZE, or the largest batches of that tier are refused.
+    RATELIMIT_TIERS = {
+        'standard': {'read': '120 per minute', 'write': '120 per minute', 'bulk': '5 per minute'},
+        'premium': {'read': '600 per minute', 'write': '600 per minute', 'bulk': '30 per minute'},
+    }
+    RATELIMIT_DEFAULT_TIER = 'standard'
+
+    # Limit for the anonymous /signup and /login endpoints, keyed by client address
+    RATELIMIT_AUTH_LIMIT = '10 per minute'
+
     # Regular expression for validating email addresses
     EMAIL_REGEX = r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$'
     
     # Minimum length for passwords
     PASSWORD_MIN_LENGTH = 8
 
+    # werkzeug password hash method, e.g. 'scrypt' or 'pbkdf2:sha256:600000'. Hashes made
+    # with other parameters are transparently rehashed on the next successful login.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'scrypt'
+
+    # Processes used for password hashing (0 hashes inline on the request thread), how many
+    # more jobs may wait before requests get a 503, and seconds to wait for a result
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or 2)
+    PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASH_QUEUE_SIZE') or 8)
+    PASSWORD_HASH_TIMEOUT = 10
+
+    # Maximum number of posts accepted by a single POST /posts/batch request
+    POSTS_BATCH_MAX_SIZE = 100
+
+    # Group commit of POST /posts (see app/group_commit.py): concurrent creations arriving
+    # within GROUP_COMMIT_MAX_WAIT seconds, up to GROUP_COMMIT_MAX_BATCH of them, share one
+    # transaction; a request waits at most GROUP_COMMIT_TIMEOUT seconds for its commit
+    GROUP_COMMIT_ENABLED = os.environ.get('GROUP_COMMIT_ENABLED', '').lower() in ('1', 'true', 'yes')
+    GROUP_COMMIT_MAX_BATCH = 64
+    GROUP_COMMIT_MAX_WAIT = 0.005
+    GROUP_COMMIT_TIMEOUT = 10
+
+    # Number of rows fetched from the database per chunk when streaming GET /posts/export
+    EXPORT_CHUNK_SIZE = 500
+
+    # Number of posts committed per transaction when importing NDJSON
+    IMPORT_CHUNK_SIZE = 1000
+
+    # Longest accepted GET /posts/search query and largest page of results
+    SEARCH_MAX_QUERY_LENGTH = 256
+    SEARCH_MAX_LIMIT = 50
+
+    # Response compression: encodings in preference order (zstd only if the zstandard
+    # package is installed), compressible mimetypes, minimum body size in bytes and levels
+    COMPRESS_ALGORITHMS = ('zstd', 'gzip')
+    COMPRESS_MIMETYPES = ('application/json', 'application/x-ndjson')
+    COMPRESS_MIN_SIZE = 500
+    COMPRESS_LEVEL = 6
+    COMPRESS_ZSTD_LEVEL = 3
+
+    # Seconds a compressed body is kept, keyed by its strong ETag, so cache hits are not recompressed
+    COMPRESS_CACHE_TIMEOUT = 60
+
+    # JSON application log written by a background thread, rotated every LOG_MAX_MB megabytes
+    LOG_FILE = os.environ.get('LOG_FILE') or 'logs/blog_api.log'
+    LOG_MAX_MB = 10
+    LOG_BACKUP_COUNT = 10
+
+    # INFO messages logged on every read; only LOG_SAMPLE_RATE of them (0.0-1.0) are kept
+    LOG_SAMPLED_MESSAGES = ('Posts retrieved successfully', 'Post retrieved successfully: %s', 'Posts searched successfully')
+    LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE') or 0.1)
+
+    # Directory where each worker process dumps its metrics for /metrics to merge (relative
+    # to the instance folder; it must be private to the app's user, so never a shared
+    # directory such as /tmp), how often (seconds) a worker rewrites its file, and request
+    # latency histogram buckets (seconds)
+    METRICS_DIR = os.environ.get('METRICS_DIR') or 'metrics'
+    METRICS_FLUSH_INTERVAL = 5
+    METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    # Request profiling: always for requests carrying a token from `flask profile-token` in
+    # PROFILE_HEADER, and for a PROFILE_SAMPLE_RATE fraction of requests when PROFILE_ENABLED.
+    # PROFILE_MODE is 'cprofile' (pstats dumps) or 'sampler' (collapsed stacks for flame graphs,
+    # one sample every PROFILE_SAMPLER_INTERVAL seconds); dumps go to PROFILE_DIR/<endpoint>/,
+    # relative to the instance folder and private to the app's user (never a shared
+    # directory such as /tmp), which keeps the newest PROFILE_MAX_FILES of each endpoint
+    PROFILE_ENABLED = os.environ.get('PROFILE_ENABLED', '').lower() in ('1', 'true', 'yes')
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE') or 0.01)
+    PROFILE_MODE = os.environ.get('PROFILE_MODE') or 'sampler'
+    PROFILE_SAMPLER_INTERVAL = 0.005
+    PROFILE_DIR = os.environ.get('PROFILE_DIR') or 'profiles'
+    PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES') or 100)
+    PROFILE_HEADER = 'X-Profile-Token'
+    PROFILE_TOKEN_MAX_AGE = 3600
+
 class TestConfig(Config):
     # Enable testing mode
     TESTING = True
@@ -34,3 +186,19 @@ class TestConfig(Config):
     
     # Disable modification tracking to save resources during testing
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # The in-memory database uses a single-connection pool that takes no pool options, and no replicas
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    SQLALCHEMY_BINDS = {}
+    DATABASE_REPLICAS = ()
+
+    # Keep cache entries and rate limit counters private to each test app
+    CACHE_TYPE = 'SimpleCache'
+    RATELIMIT_STORAGE_URI = 'memory://'
+
+    # Report metrics of the test process only
+    METRICS_DIR = None
+
+    # Cheap password hashes computed inline to keep the tests fast
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+    PASSWORD_HASH_WORKERS = 0
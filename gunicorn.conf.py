@@ -0,0 +1,45 @@
+# Production server settings, read from Config (see the SERVER_* settings in config.py):
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#
+# The app is loaded once in the master (preload_app) and forked into the workers, which
+# share its memory copy-on-write. Each worker warms up before accepting traffic, is
+# replaced after SERVER_MAX_REQUESTS requests to contain leaks, and on SIGTERM finishes
+# in-flight requests for up to SERVER_GRACEFUL_TIMEOUT seconds.
+from config import Config
+
+bind = Config.SERVER_BIND
+workers = Config.SERVER_WORKERS
+worker_class = 'gthread'
+threads = Config.SERVER_THREADS
+preload_app = True
+max_requests = Config.SERVER_MAX_REQUESTS
+max_requests_jitter = Config.SERVER_MAX_REQUESTS_JITTER
+timeout = Config.SERVER_TIMEOUT
+graceful_timeout = Config.SERVER_GRACEFUL_TIMEOUT
+
+# Every worker has its own pool per engine, so the workers together may open
+# SERVER_WORKERS * (pool_size + max_overflow) connections to each database server
+def on_starting(server):
+    options = Config.SQLALCHEMY_ENGINE_OPTIONS
+    per_worker = options.get('pool_size', 5) + options.get('max_overflow', 10)
+    if server.cfg.workers * per_worker > Config.DATABASE_MAX_CONNECTIONS:
+        server.log.warning('%s workers with up to %s connections each exceed DATABASE_MAX_CONNECTIONS (%s); '
+                           'lower WEB_CONCURRENCY, DATABASE_POOL_SIZE or DATABASE_MAX_OVERFLOW',
+                           server.cfg.workers, per_worker, Config.DATABASE_MAX_CONNECTIONS)
+
+def post_fork(server, worker):
+    from wsgi import app
+    from app.server import after_fork
+    after_fork(app)
+
+# Runs after the worker has loaded the app and before it accepts connections
+def post_worker_init(worker):
+    from wsgi import app
+    from app.server import warm_up
+    warm_up(app)
+    worker.log.info('Worker %s warmed up', worker.pid)
+
+def worker_exit(server, worker):
+    from wsgi import app
+    from app.server import shutdown
+    shutdown(app)
@@ -90,9 +90,18 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # the full-text search objects are created by raw DDL and are not mapped on the
+    # models; keep autogenerate from proposing to drop them
+    def include_object(object, name, type_, reflected, compare_to):
+        if reflected and compare_to is None and (name == 'search_vector' or (name or '').startswith('blog_post_fts')):
+            return False
+        return True
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_object") is None:
+        conf_args["include_object"] = include_object
 
     connectable = get_engine()
 
@@ -0,0 +1,57 @@
+"""Add full-text search index over blog posts
+
+Revision ID: b5d9e2c7a310
+Revises: f3a60b2d8e41
+Create Date: 2026-10-17 15:02:41.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d9e2c7a310'
+down_revision = 'f3a60b2d8e41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # Generated column: PostgreSQL recomputes it on every insert and update of title/body
+        op.execute(
+            "ALTER TABLE blog_post ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(body, '')), 'B')) STORED")
+        op.execute("CREATE INDEX ix_blog_post_search_vector ON blog_post USING GIN (search_vector)")
+    elif dialect == 'sqlite':
+        # External-content FTS5 table kept in sync by triggers. Note that batch migrations
+        # recreating blog_post on SQLite drop these triggers; re-run this DDL after them.
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS blog_post_fts USING fts5("
+            "title, body, content='blog_post', content_rowid='id', tokenize='porter unicode61')")
+        op.execute(
+            "CREATE TRIGGER blog_post_fts_insert AFTER INSERT ON blog_post BEGIN "
+            "INSERT INTO blog_post_fts (rowid, title, body) VALUES (new.id, new.title, new.body); END")
+        op.execute(
+            "CREATE TRIGGER blog_post_fts_delete AFTER DELETE ON blog_post BEGIN "
+            "INSERT INTO blog_post_fts (blog_post_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); END")
+        op.execute(
+            "CREATE TRIGGER blog_post_fts_update AFTER UPDATE OF title, body ON blog_post BEGIN "
+            "INSERT INTO blog_post_fts (blog_post_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body); "
+            "INSERT INTO blog_post_fts (rowid, title, body) VALUES (new.id, new.title, new.body); END")
+        # Index the posts that already exist
+        op.execute("INSERT INTO blog_post_fts (blog_post_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_blog_post_search_vector")
+        op.execute("ALTER TABLE blog_post DROP COLUMN IF EXISTS search_vector")
+    elif dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS blog_post_fts_update")
+        op.execute("DROP TRIGGER IF EXISTS blog_post_fts_delete")
+        op.execute("DROP TRIGGER IF EXISTS blog_post_fts_insert")
+        op.execute("DROP TABLE IF EXISTS blog_post_fts")
@@ -0,0 +1,35 @@
+"""Add updated_at to blog_post
+
+Revision ID: e82d5f0a6c17
+Revises: c4f18a7e5b90
+Create Date: 2026-10-17 11:41:07.552870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e82d5f0a6c17'
+down_revision = 'c4f18a7e5b90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('blog_post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    # Existing posts have never been edited as far as we can tell, so start from their creation time
+    blog_post = sa.table('blog_post', sa.column('timestamp', sa.DateTime), sa.column('updated_at', sa.DateTime))
+    op.execute(blog_post.update().values(updated_at=sa.func.coalesce(blog_post.c.timestamp, sa.func.now())))
+
+    with op.batch_alter_table('blog_post', schema=None) as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index('ix_blog_post_user_id_updated_at', ['user_id', 'updated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('blog_post', schema=None) as batch_op:
+        batch_op.drop_index('ix_blog_post_user_id_updated_at')
+        batch_op.drop_column('updated_at')
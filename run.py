@@ -1,5 +1,10 @@
+import click
+import os
 from app import create_app, db
 from app.models import User, BlogPost
+from app.importer import import_posts
+from app.private_files import private_directory, owned_files
+from app.profiling import profiler, merge_pstats, merge_collapsed, EXTENSIONS
 
 app = create_app()
 
@@ -7,5 +12,57 @@ app = create_app()
 def make_shell_context():
     return {'db': db, 'User': User, 'BlogPost': BlogPost}
 
+@app.cli.command('reconcile-post-counts')
+def reconcile_post_counts():
+    """Rebuild the denormalized per-user post counters."""
+    fixed = User.reconcile_post_counts()
+    click.echo(f'Reconciled post counts for {fixed} user(s)')
+
+@app.cli.command('import-posts')
+@click.argument('source', type=click.File('rb'))
+@click.option('--user', 'username', required=True, help='Email of the user who will own the posts.')
+@click.option('--chunk-size', default=None, type=click.IntRange(min=1), help='Posts committed per transaction.')
+def import_posts_command(source, username, chunk_size):
+    """Import posts from an NDJSON file (or - for stdin)."""
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f'No user with email {username}')
+
+    summary = import_posts(source, user.id, chunk_size=chunk_size or app.config['IMPORT_CHUNK_SIZE'])
+    for error in summary['errors']:
+        click.echo(f"line {error['line']}: {error['message']}", err=True)
+    click.echo(f"Imported {summary['imported']} post(s), {summary['failed']} failed")
+
+@app.cli.command('profile-token')
+def profile_token():
+    """Print a token that turns on profiling for requests sending it in the profiling header."""
+    click.echo(f"{app.config['PROFILE_HEADER']}: {profiler.make_token()}")
+
+@app.cli.command('merge-profiles')
+@click.argument('endpoint')
+@click.option('--format', 'kind', type=click.Choice(['pstats', 'collapsed']), default='collapsed', help='Which dumps to merge.')
+@click.option('--output', '-o', required=True, type=click.Path(dir_okay=False), help='File to write the merged profile to.')
+def merge_profiles(endpoint, kind, output):
+    """Merge the profiles of one endpoint (e.g. routes.get_posts) into a single file."""
+    extension = EXTENSIONS['cprofile' if kind == 'pstats' else 'sampler']
+    directory = os.path.join(app.config['PROFILE_DIR'], endpoint)
+    paths = []
+    if os.path.isdir(directory):
+        # pstats dumps are unmarshalled: only load files of this user from private directories
+        try:
+            private_directory(app.config['PROFILE_DIR'])
+            private_directory(directory)
+        except PermissionError as e:
+            raise click.ClickException(str(e))
+        paths = [os.path.join(directory, name) for name in owned_files(directory) if name.endswith(extension)]
+    if not paths:
+        raise click.ClickException(f'No {kind} profiles for {endpoint} in {app.config["PROFILE_DIR"]}')
+
+    if kind == 'pstats':
+        merge_pstats(paths, output)
+    else:
+        merge_collapsed(paths, output)
+    click.echo(f'Merged {len(paths)} profile(s) into {output}')
+
 if __name__ == '__main__':
     app.run(debug=True)